@@ -0,0 +1,197 @@
+""" Reading of several devices, one wearer per serial port, in one thread
+The ports are waited on with one selector, so the thread sleeps until any of them has data.
+Every device has its own reader, parser state (the last values for the outliers) and its consumers:
+a SampleQueue, e.g. the one drained by the window, and/or a SessionLogWriter.
+While is_paused() of a device returns True, e.g. the window is paused, its lines are read and dropped,
+so the port does not fill up and the samples of the pause are not shown later.
+Windows can not select on the serial ports, there the thread polls in_waiting of every port
+and sleeps for poll_interval when none has data.
+
+Usage without the window (Linux/macOS, with serial_replay.py):
+    python acquisition_manager.py /dev/pts/3 /dev/pts/5 --duration 60
+"""
+
+import sys
+import time
+import argparse
+import selectors
+import threading
+from typing import Callable, Union
+import serial
+import ui_config
+from serial_manager import SerialLineReader
+from data_parser import parse_lines, replace_outliers, DEFAULT_VALUE
+from sample_queue import SampleQueue
+from session_log import SessionLogWriter, create_session_log
+
+
+def get_port_name(port: str) -> str:
+    """ e.g. COM8 or pts5 for /dev/pts/5, for the names of the files """
+    return port.replace("/dev/", "").replace("/", "")
+
+
+class Device:
+    """ One serial port with the parser state and the counters of its wearer """
+    def __init__(self, name: str, ser: serial.Serial, sensors_num: int,
+                 queue: Union[SampleQueue, None] = None, log: Union[SessionLogWriter, None] = None, recorder=None,
+                 is_paused: Union[Callable[[], bool], None] = None):
+        self.name = name
+        self.ser = ser
+        self.reader = SerialLineReader(ser, recorder=recorder)
+        self.queue = queue
+        self.log = log
+        self.is_paused = is_paused
+        self.last_values = [DEFAULT_VALUE] * sensors_num
+        self.samples_num = 0
+        self.rejected_num = 0
+        self.paused_num = 0  # lines dropped while paused
+        self.start_time = time.monotonic()
+        self.last_stats = (self.start_time, 0)  # (time, samples_num) of the previous get_stats
+
+    def read(self) -> int:
+        """ Parse every complete line received so far and hand the samples to the consumers
+        :returns number of samples
+        """
+        lines = self.reader.read_lines()
+        if not lines:
+            return 0
+        if self.is_paused is not None and self.is_paused():
+            self.paused_num += len(lines)
+            return 0
+        values, rejected = parse_lines(lines)
+        self.rejected_num += rejected
+        if len(values) == 0:
+            return 0
+        values = replace_outliers(values, self.last_values)
+        self.last_values = values[-1]
+        timestamp = time.time_ns()
+        if self.queue is not None:
+            self.queue.publish(values, timestamp)
+        if self.log is not None:
+            self.log.append(values, timestamp)
+        self.samples_num += len(values)
+        return len(values)
+
+    def get_stats(self) -> dict:
+        """ Throughput since the previous call and the counters since the start """
+        now = time.monotonic()
+        last_time, last_samples = self.last_stats
+        self.last_stats = (now, self.samples_num)
+        return {"name": self.name,
+                "rate": round((self.samples_num - last_samples) / max(now - last_time, 1e-9), 1),
+                "samples": self.samples_num,
+                "bytes": self.reader.bytes_num,
+                "rejected": self.rejected_num,
+                "paused": self.paused_num,
+                "dropped": self.queue.dropped_num if self.queue is not None else 0}
+
+    def close(self) -> None:
+        self.ser.close()
+        if self.log is not None:
+            self.log.close()
+        if self.reader.recorder is not None:
+            self.reader.recorder.close()
+
+
+class AcquisitionManager(threading.Thread):
+    """ Reads all devices in its own thread until stop() """
+    def __init__(self, poll_interval=ui_config.Measurements.thread_delay.value):
+        super().__init__(daemon=True)
+        self.devices = list()
+        self.poll_interval = poll_interval  # s, without a selector only
+        self.selector = selectors.DefaultSelector() if sys.platform != "win32" else None
+        self.is_stopped = False
+
+    def add_device(self, port: str, sensors_num: int, queue: Union[SampleQueue, None] = None,
+                   log: Union[SessionLogWriter, None] = None, recorder=None,
+                   is_paused: Union[Callable[[], bool], None] = None) -> Union[Device, None]:
+        """ Open the port, None if it can not be opened; the devices are added before start() """
+        try:
+            # the reads return at once, the selector does the waiting
+            ser = serial.Serial(port, ui_config.Measurements.serial_baudrate.value,
+                                timeout=0 if self.selector is not None else ui_config.Measurements.serial_timeout.value)
+        except serial.SerialException as e:
+            print(f"Error opening serial port: {e}")
+            return None
+        device = Device(port, ser, sensors_num, queue=queue, log=log, recorder=recorder, is_paused=is_paused)
+        self.devices.append(device)
+        if self.selector is not None:
+            self.selector.register(ser.fileno(), selectors.EVENT_READ, device)
+        return device
+
+    def run(self) -> None:
+        while not self.is_stopped:
+            if not self.devices:
+                time.sleep(self.poll_interval)
+                continue
+            if self.selector is not None:
+                timeout: float = ui_config.Measurements.serial_timeout.value
+                ready = [key.data for key, _ in self.selector.select(timeout=timeout)]
+            else:
+                ready = [device for device in list(self.devices) if self.has_data(device)]  # has_data may remove one
+                if not ready:
+                    time.sleep(self.poll_interval)
+            for device in ready:
+                try:
+                    device.read()
+                except (serial.SerialException, OSError) as e:
+                    print(f"{device.name} is disconnected: {e}")
+                    self.remove_device(device)
+        for device in self.devices:
+            device.close()
+        if self.selector is not None:
+            self.selector.close()
+        print("Data Parsing has been stopped")
+
+    def has_data(self, device: Device) -> bool:
+        try:
+            return device.ser.in_waiting > 0
+        except (serial.SerialException, OSError) as e:
+            print(f"{device.name} is disconnected: {e}")
+            self.remove_device(device)
+            return False
+
+    def remove_device(self, device: Device) -> None:
+        if device not in self.devices:
+            return
+        if self.selector is not None:
+            self.selector.unregister(device.ser.fileno())
+        self.devices.remove(device)
+        device.close()
+
+    def stop(self) -> None:
+        self.is_stopped = True
+        if self.is_alive():
+            self.join()
+
+    def get_stats(self) -> list[dict]:
+        """ Safe to call from any thread """
+        return [device.get_stats() for device in list(self.devices)]
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description="Read several devices and print their throughput")
+    parser.add_argument("ports", nargs="+")
+    parser.add_argument("--duration", type=float, default=10.0, help="s")
+    parser.add_argument("--log", action="store_true", help="write the session log of every device")
+    options = parser.parse_args(args)
+
+    sensors_num = len(ui_config.ElementNames.sensor_names.value)
+    manager = AcquisitionManager()
+    for port in options.ports:
+        log = create_session_log(ui_config.ElementNames.sensor_names.value, suffix="_" + get_port_name(port)) \
+            if options.log else None
+        manager.add_device(port, sensors_num, queue=SampleQueue(ui_config.Measurements.sample_queue_capacity.value),
+                           log=log)
+    manager.start()
+    end = time.monotonic() + options.duration
+    while time.monotonic() < end:
+        time.sleep(1.0)
+        for device in manager.devices:
+            device.queue.drain()  # nobody shows the samples here
+        print(manager.get_stats())
+    manager.stop()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
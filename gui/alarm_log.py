@@ -0,0 +1,102 @@
+""" Alarms of a session as typed records in growing numpy arrays
+Every alarm is (sample index, time of receipt in epoch ns, prediction score).
+The alarms closer than max_gap to the end of the last episode extend it, the others start a new one,
+so the episodes, the total alarm time and the longest episode are kept up to date in O(1) per alarm
+"""
+
+import numpy as np
+
+EVENT_DTYPE = np.dtype([('index', np.int64), ('time', np.int64), ('score', np.float32)])
+EPISODE_DTYPE = np.dtype([('start', np.int64), ('end', np.int64), ('events_num', np.int64)])  # epoch ns
+
+
+def grow(array: np.ndarray) -> np.ndarray:
+    grown = np.empty(2 * len(array), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class AlarmLog:
+    """ The alarms are expected in the order of receipt, as DetectionWorker delivers them """
+    def __init__(self, max_gap=2.0, capacity=1024):
+        self.max_gap = int(max_gap * 1e9)  # ns
+        self.events = np.empty(capacity, dtype=EVENT_DTYPE)
+        self.episodes = np.empty(capacity, dtype=EPISODE_DTYPE)
+        self.events_num = 0
+        self.episodes_num = 0
+        self.total_time = 0  # ns, sum of the durations of the episodes
+        self.longest = 0  # ns
+
+    def __len__(self) -> int:
+        return self.events_num
+
+    def append(self, index: int, timestamp: int, score=0.0) -> bool:
+        """ :returns True if the alarm started a new episode """
+        if self.events_num == len(self.events):
+            self.events = grow(self.events)
+        self.events[self.events_num] = (index, timestamp, score)
+        self.events_num += 1
+        last = self.episodes_num - 1
+        if last >= 0 and timestamp - int(self.episodes['end'][last]) <= self.max_gap:
+            previous_end = int(self.episodes['end'][last])
+            end = max(timestamp, previous_end)
+            self.total_time += end - previous_end
+            self.episodes['end'][last] = end
+            self.episodes['events_num'][last] += 1
+            self.longest = max(self.longest, end - int(self.episodes['start'][last]))
+            return False
+        if self.episodes_num == len(self.episodes):
+            self.episodes = grow(self.episodes)
+        self.episodes[self.episodes_num] = (timestamp, timestamp, 1)
+        self.episodes_num += 1
+        return True
+
+    def get_events(self) -> np.ndarray:
+        """ Copy of the alarms with the fields index, time and score """
+        return self.events[:self.events_num].copy()
+
+    def get_times(self) -> np.ndarray:
+        return self.events['time'][:self.events_num].copy()
+
+    def get_episodes(self) -> np.ndarray:
+        """ Copy of the episodes with the fields start, end and events_num """
+        return self.episodes[:self.episodes_num].copy()
+
+    def get_total_time(self) -> float:
+        """ s """
+        return self.total_time / 1e9
+
+    def get_longest_episode(self) -> float:
+        """ s """
+        return self.longest / 1e9
+
+    def get_summary(self) -> dict:
+        return {"alarms_num": self.events_num,
+                "episodes_num": self.episodes_num,
+                "total_time_s": round(self.get_total_time(), 3),
+                "longest_episode_s": round(self.get_longest_episode(), 3)}
+
+    @classmethod
+    def from_times(cls, times, max_gap=2.0) -> 'AlarmLog':
+        """ Log of the saved alarm times in the order of receipt, e.g. SessionFile.alarm_times,
+        without the indices and scores; the episodes are found at once, with the same rule as append()
+        """
+        times = np.asarray(times, dtype=np.int64)
+        log = cls(max_gap, capacity=max(len(times), 1))
+        if not len(times):
+            return log
+        log.events_num = len(times)
+        log.events['index'][:len(times)] = -1
+        log.events['time'][:len(times)] = times
+        log.events['score'][:len(times)] = 0.0
+        breaks = np.flatnonzero(np.diff(times) > log.max_gap) + 1
+        starts = np.concatenate([[0], breaks])
+        ends = np.concatenate([breaks - 1, [len(times) - 1]])
+        log.episodes_num = len(starts)
+        log.episodes['start'][:len(starts)] = times[starts]
+        log.episodes['end'][:len(starts)] = times[ends]
+        log.episodes['events_num'][:len(starts)] = ends - starts + 1
+        durations = times[ends] - times[starts]
+        log.total_time = int(durations.sum())
+        log.longest = int(durations.max())
+        return log
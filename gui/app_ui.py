@@ -1,12 +1,12 @@
 import tkinter as tk
 from tkinter import filedialog
-from typing import Callable, Union
+from typing import Callable, Union, TYPE_CHECKING
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib.animation import FuncAnimation
 import datetime
+import time
 import ui_config
-from database_manager import DatabaseManager, UserDetails
+from database_manager import DatabaseManager, UserDetails, SessionInstance
 from custom_widgets import (Clock,
                             TkCustomImage,
                             UserDetailsWindow,
@@ -14,41 +14,43 @@ from custom_widgets import (Clock,
                             UserRegistrationWindow,
                             NotesEntryFrame,
                             GraphScrollBar)
-from tensorflow.keras.models import load_model
+from sensor_buffer import SensorBuffer, format_times
+from graph_blitter import GraphBlitter
+from perf_metrics import FrameTimer, get_rate_stats
+from sliding_window import SensorWindowRange
+from sample_queue import SampleQueue
+from session_log import SessionLogWriter, create_session_log
+from session_file import SessionFile, save_session_file
+from lod_pyramid import MinMaxPyramid
+from thumbnail_cache import ThumbnailCache
+import threading
+from posture_model import DetectionWorker, ModelLoader
 import numpy as np
 import os
-import pandas as pd
 from matplotlib.widgets import SpanSelector
 from matplotlib.patches import Rectangle
 import sys
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class App(tk.Tk):
     """ GUI to show Data Storage
-    sensor_values is a dict of list of the values from the sensors:
-    {"Sensor #:
-        [1, 2, 3],
-    }
-    data_thread is a side thread to read data async
+    sensor_buffer is a fixed-capacity ring buffer of the values from the sensors
+    and their timestamps, addressed by the sample number since the start
+    data_thread is a side thread to read data async,
+    it publishes the values to sample_queue, which is drained by the Tk main loop per frame
     """
     def __init__(self, title: str):
         super().__init__()
         # Update app attributes
         self.title(title)
         # self.attributes("-fullscreen", True)
-        self.db_manager = DatabaseManager()
-        # Standard variables
-        self.sensor_values = dict()
-        self.sensor_time = list()  # list[str]
-        self.alarm_num = 0
+        self.init_state()
         self.button_num = 0
         self.menu_button_num = 0
-        self.is_stopped = False
-        self.is_paused = False
-        self.graph_size = (12, 4)
         self.info_panel_wnum = 0
-        self.prev_alarm_pos = 0
-        self.user_data = None
         # Structure of each frame
         self.header_row = 0
         self.header_frame = tk.Frame(self)
@@ -60,17 +62,12 @@ class App(tk.Tk):
         self.info_panel = tk.Frame(self.body_frame)
         self.info_panel.grid(row=self.body_row, column=0, padx=10, pady=5)
 
-        self.alarm_num_label = None
-        self.alarm_text_label = None
         # Graph
         self.selected_span = None
         self.span_rect = None
         self.span_selector = None
         self.graph_frame = None
-        self.graph_canvas = None
-        self.graph_ax = None
-        self.figure = None
-        self.func_ani = None
+        self.frame_rate_label = None
         # Graph Scroll Bar elements
         self.graph_scroll_bar = None
         self.scroll_bar_frame = None
@@ -85,51 +82,119 @@ class App(tk.Tk):
         self.registration_popup = None
         self.edit_photo_popup = None
 
-        self.graph_lines = list()  # list of lines
         self.control_buttons = dict()
         # Set up frames and object instances
         self.create_major_frames()
         self.add_header_elements(title=ui_config.ElementNames.app_title.value)
         self.add_body_elements()
+        self.session_log = self.create_session_log(self.sensor_buffer.sensor_names)
+        # the model is loaded once the window is shown, the detection starts when it is ready
+        self.after_idle(self.start_model_loader)
+
+    def init_state(self, sensor_names=None) -> None:
+        """ Attributes which do not need the window, so the data path can also run headless """
+        if sensor_names is None:
+            sensor_names: list[str] = ui_config.ElementNames.sensor_names.value
+        self.db_manager = DatabaseManager()
+        # Standard variables
+        self.sensor_buffer = self.create_sensor_buffer(sensor_names)
+        self.sample_queue = SampleQueue(capacity=ui_config.Measurements.sample_queue_capacity.value)
+        self.session_log = None
+        self.history = None  # SessionFile shown instead of the live data
+        # min/max summaries of the whole session and of the opened one for the history view
+        self.lod_pyramid = MinMaxPyramid(len(sensor_names))
+        self.history_pyramid = None
+        # min and max of the visible values for autoscaling of the graph
+        self.graph_y_range = SensorWindowRange(self.sensor_buffer,
+                                               window=ui_config.Measurements.graph_x_limit.value
+                                               or self.sensor_buffer.capacity)
+        self.alarm_num = 0
+        self.is_stopped = False
+        self.is_paused = False
+        self.graph_size = (12, 4)
+        self.prev_alarm_pos = 0
+        self.user_data = None
+
+        self.alarm_num_label = None
+        self.alarm_text_label = None
+        # Graph
+        self.graph_canvas = None
+        self.graph_ax = None
+        self.figure = None
+        self.graph_lines = list()  # list of lines
+        self.graph_blitter = None
+        self.frame_timer = FrameTimer()
+        self.startup_profile = None  # perf_metrics.StartupProfile reported at the first frame
 
-        # self.model = load_model('model_all.h5')
         self.current_user_id = None
         self.current_user_features = None
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        self.csv_path = os.path.join(base_path, 'data', 'users', 'logins.csv')
-
-    def detect_anomaly(self, data: dict):
-        # print("detect_anomaly called with data:", data) do not need to print out. only for debugging.
-        sensor_2, sensor_4 = "Sensor 2", "Sensor 4"
-        if sensor_2 in data and sensor_4 in data and data[sensor_2] and data[sensor_4]:
-            recent_data = np.array([[data[sensor_2][-1], data[sensor_4][-1]]])
-            print("recent_data:", recent_data)
-
-            if self.current_user_features is None:
-                print("No user features available.")
-                return
-
-            print(f"User features: {self.current_user_features}")
-
-            sensor4_2_diff = data[sensor_4][-1] - data[sensor_2][-1]
-            length = data[sensor_4][-1] * np.cos(np.radians(20)) - data[sensor_2][-1]
-            ratio = length / self.current_user_features[4]  # flexibility
-            cos_20 = np.cos(np.radians(20))
-            sin_20 = np.sin(np.radians(20))
-            tangent_d = (data[sensor_4][-1] * cos_20 - data[sensor_2][-1]) / (data[sensor_4][-1] * sin_20)
-            degree = np.degrees(np.arctan(tangent_d))
-
-            dynamic_features = np.array(
-                [length, degree, sensor4_2_diff, recent_data[0, 0], recent_data[0, 1], self.current_user_features[4],
-                 ratio])
-            input_data = np.hstack((self.current_user_features[:4], dynamic_features))
-            print("input_data:", input_data)
-
-            prediction = self.model.predict(input_data.reshape(1, -1))
-            print("prediction:", prediction)
-            if prediction[0][0] == 0:
-                self.update_alarm_num(pos=len(data[sensor_2]) - 1)
-                print("Alarm raised.")
+        self.is_checking_password = False  # a sign-in or registration is running in the background
+        self.thumbnails = ThumbnailCache(ui_config.FilePaths.thumbnail_folder_path.value,
+                                         capacity=ui_config.Measurements.thumbnail_cache_size.value,
+                                         disk_capacity=ui_config.Measurements.thumbnail_disk_cache_size.value)
+        self.photo_path = None  # the latest photo requested by set_user_photo
+        self.model = None
+        self.model_loader = None
+        self.detection_worker = None
+
+    @staticmethod
+    def create_sensor_buffer(sensor_names: list[str]) -> SensorBuffer:
+        spill_path = None
+        if ui_config.Measurements.spill_evicted.value:
+            folder: str = ui_config.FilePaths.spill_folder_path.value
+            os.makedirs(folder, exist_ok=True)
+            spill_path = folder + "/spill_" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + ".bin"
+        return SensorBuffer(sensor_names=sensor_names,
+                            capacity=ui_config.Measurements.buffer_capacity.value,
+                            spill_path=spill_path,
+                            spill_chunk=ui_config.Measurements.spill_chunk.value)
+
+    @staticmethod
+    def create_session_log(sensor_names: list[str], suffix="") -> Union[SessionLogWriter, None]:
+        return create_session_log(sensor_names, suffix)
+
+    def destroy(self) -> None:
+        """ Close the session log properly before the window """
+        if self.session_log is not None:
+            self.session_log.close()
+            print(f"Session log saved to {self.session_log.path}")
+            self.session_log = None
+        if self.detection_worker is not None:
+            self.detection_worker.stop()
+        super().destroy()
+
+    def start_model_loader(self) -> None:
+        self.model_loader = ModelLoader(model_path=ui_config.FilePaths.model_path.value,
+                                        cache_path=ui_config.FilePaths.model_cache_path.value)
+        self.model_loader.start()
+
+    def check_model_loader(self) -> None:
+        """ Start the detection when the model loaded in the background is ready """
+        loader = self.model_loader
+        if loader is None or not loader.is_ready():
+            return
+        self.model_loader = None
+        print(f"Model loaded in {loader.load_time:.2f} s")
+        self.set_model(loader.predict)
+
+    def set_model(self, predict: Callable[[np.ndarray], np.ndarray]) -> None:
+        """ Start the detection with the scoring function of the model from the next received sample
+        :param predict is made by posture_model.load_predict
+        """
+        self.model = predict
+        if self.detection_worker is not None:
+            self.detection_worker.stop()
+        self.detection_worker = DetectionWorker(predict, self.sensor_buffer.sensor_names,
+                                                capacity=ui_config.Measurements.detection_queue_capacity.value)
+        self.detection_worker.start()
+
+    def detect_anomaly(self):
+        """ Show the alarms found by the detection worker since the previous frame """
+        if self.detection_worker is None:
+            return
+        for pos, alarm_time, score in self.detection_worker.get_alarms():
+            self.update_alarm_num(pos=pos, alarm_time=alarm_time, score=score)
+            print(f"Alarm raised at sample {pos}.")
 
     def create_major_frames(self):
         self.header_frame.pack(fill='both', expand=False)
@@ -158,7 +223,8 @@ class App(tk.Tk):
         photo_h: int = ui_config.Measurements.photo_h.value
         user_photo = TkCustomImage(file_path=image_path,
                                    w=photo_w,
-                                   h=photo_h)
+                                   h=photo_h,
+                                   cache=self.thumbnails)
         img_label: tk.Label = user_photo.attach_image(master=self.header_frame,
                                                       row=self.body_row,
                                                       col=0)
@@ -176,49 +242,127 @@ class App(tk.Tk):
     def run_app(self) -> None:
         self.mainloop()
 
+    def draw_frame(self) -> None:
+        """ Update the lines and render only what has changed, then schedule the next frame """
+        start = self.frame_timer.start()
+        self.check_model_loader()
+        self.drain_sample_queue()
+        self.detect_anomaly()
+        self.update_graph()
+        full_redraw: bool = self.graph_blitter.update()
+        self.frame_timer.stop(start, full_redraw=full_redraw)
+        if self.frame_timer.frames_num == 1:
+            self.report_first_frame()
+        if not self.is_stopped:
+            self.after(ui_config.Measurements.frame_interval.value, self.draw_frame)
+
+    def report_first_frame(self) -> None:
+        print(f"First frame after {self.frame_timer.first_frame_uptime:.2f} s")
+        if self.startup_profile is not None:
+            self.startup_profile.mark("first frame")
+            self.startup_profile.stop_tracking_imports()
+            print(self.startup_profile.report())
+
     def update_graph(self, event=None, lower_range=None, upper_range=None) -> list:
-        # Param event is essential for correct update of the graph
+        # Param event is kept for the compatibility with the matplotlib callbacks
         lines = []
         if upper_range is None:
             upper_range: int = ui_config.Measurements.graph_x_limit.value
-        if self.sensor_values and not self.is_paused:
-            for i, sens_name in enumerate(self.sensor_values.keys()):
+        if self.sensor_buffer.total and not self.is_paused:
+            for i, sens_name in enumerate(self.sensor_buffer.sensor_names):
                 x, y = self.get_axes_values(sens_name, upper_limit=upper_range,
                                             lower_limit=lower_range)
                 self.graph_lines[i].set_data(x, y)
-                if x[0] != x[-1]:
-                    self.graph_ax.set_xlim(x[0], x[-1])
                 lines.append(self.graph_lines[i])
-            y_min = min((min(y) for y in self.sensor_values.values() if y), default=0)
-            y_max = max((max(y) for y in self.sensor_values.values() if y), default=1)
-            self.graph_ax.set_ylim(y_min, y_max)
-            self.detect_anomaly(self.sensor_values)
-        if lower_range and upper_range:
+            self.graph_y_range.update()
+            self.set_graph_limits(x_lim=self.get_live_x_limits(last_x=x[-1], window=upper_range or len(x)),
+                                  y_lim=self.get_live_y_limits())
+        if lower_range is not None and upper_range:
             lines = []
-            for i, sens_name in enumerate(self.sensor_values.keys()):
+            for i, sens_name in enumerate(self.sensor_buffer.sensor_names):
                 x, y = self.get_axes_values(sens_name, upper_limit=upper_range,
                                             lower_limit=lower_range)
                 self.graph_lines[i].set_data(x, y)
-                self.graph_ax.set_xlim(x[0], x[-1])
                 lines.append(self.graph_lines[i])
-            self.detect_anomaly(self.sensor_values)
+            visible = [line.get_ydata() for line in lines if len(line.get_ydata())]
+            y_lim = None
+            if visible:
+                y_lim = self.round_y_limits(min(np.min(y) for y in visible), max(np.max(y) for y in visible))
+            self.set_graph_limits(x_lim=(x[0], x[-1]), y_lim=y_lim)
         return lines
 
+    def get_live_x_limits(self, last_x: int, window: int) -> tuple:
+        """ The x-axis moves forward in steps of graph_x_step of the window
+        instead of every sample, so the axes are re-rendered only once per step
+        """
+        step = max(1, int(window * ui_config.Measurements.graph_x_step.value))
+        right = step * (last_x // step + 1)
+        left = max(self.sensor_buffer.first_index, right - window - step)
+        return left, right
+
+    def get_live_y_limits(self) -> tuple:
+        """ Range of the visible values rounded outwards to graph_y_step,
+        so small changes of the values do not change the limits
+        """
+        return self.round_y_limits(*self.graph_y_range.get_limits())
+
+    @staticmethod
+    def round_y_limits(y_min: float, y_max: float) -> tuple:
+        step: int = ui_config.Measurements.graph_y_step.value
+        return step * np.floor(y_min / step), step * np.ceil(y_max / step)
+
+    def set_graph_limits(self, x_lim=None, y_lim=None) -> None:
+        """ Change the limits of the axes only if they differ from the current ones,
+        because new limits require the axes to be rendered again
+        """
+        ax = self.graph_ax
+        if x_lim is not None and x_lim[0] != x_lim[1] and ax.get_xlim() != tuple(map(float, x_lim)):
+            ax.set_xlim(*x_lim)
+            self.graph_blitter.request_axes_redraw()
+        if y_lim is not None and y_lim[0] != y_lim[1] and ax.get_ylim() != tuple(map(float, y_lim)):
+            ax.set_ylim(*y_lim)
+            self.graph_blitter.request_axes_redraw()
+
     def update_sensor_values(self, new_data: dict) -> None:
-        """ The new data should have the format:
-        {"Sensor #:
-        [1, 2, 3],
+        """ The new data is one reading per sensor:
+        {"Sensor #": 1,
         }
-        Remember the timestamp per receipt of the sensor reading
+        Safe to call from the reading thread, the values are shown on the next frame
+        """
+        values = [[new_data[name] for name in self.sensor_buffer.sensor_names]]
+        self.extend_sensor_values(values)
+
+    def extend_sensor_values(self, values: np.ndarray) -> None:
+        """ Add the readings received at once, values have the shape (n, number of sensors)
+        in the order of the sensor names
+        Safe to call from the reading thread, the timestamp is the time of receipt (epoch ns)
+        The session log is written here, before the sample queue, so it keeps the samples the queue drops
         """
-        # Remember the timestamp
-        current_time = datetime.datetime.now().strftime(ui_config.Measurements.time_format.value)
-        self.sensor_time.append(current_time)
-        # Update values
-        self.sensor_values = new_data
-        self.func_ani.event_source.start()
-
-    def update_alarm_num(self, pos: int) -> None:
+        timestamp = time.time_ns()
+        if self.session_log is not None:
+            self.session_log.append(values, timestamp)
+        self.sample_queue.publish(values, timestamp)
+
+    def drain_sample_queue(self) -> None:
+        """ Move the published readings to the sensor buffer, runs in the Tk main loop
+        Every reading is also handed once to the detection worker with its index in the buffer.
+        The batches dropped by the full sample queue (sample_queue.dropped_num) are neither shown nor scored,
+        the session log has them, it is written by the reading thread
+        """
+        for values, timestamp in self.sample_queue.drain():
+            start_index: int = self.sensor_buffer.total
+            self.sensor_buffer.extend(values, timestamp)
+            self.lod_pyramid.extend(values)
+            if self.detection_worker is not None:
+                self.detection_worker.submit(start_index, np.asarray(values, dtype=float), timestamp,
+                                             self.current_user_features)
+
+    def update_alarm_num(self, pos: int, alarm_time: int, score=0.0) -> None:
+        """ Every alarm of the current session is logged,
+        the window shows those with a different sample number than the previous one
+        """
+        if pos >= self.db_manager.session.start_index:  # a late alarm of the previous user is not theirs
+            self.db_manager.session.alarm_log.append(pos, alarm_time, score)
         if not self.alarm_num_label or not self.graph_ax or pos == self.prev_alarm_pos:
             return None
         self.alarm_num += 1
@@ -226,22 +370,22 @@ class App(tk.Tk):
         self.draw_vert_span(x=pos)
         self.prev_alarm_pos = pos
         self.add_alarm_text()
-        this_time = datetime.datetime.now().strftime(ui_config.Measurements.time_format.value)  # 确保 time_format 是字符串
-        self.db_manager.session.alarm_times.append(this_time)
 
     def draw_vert_span(self, x: int, width=1):
         # Add a vertical span to the background
-        self.graph_ax.axvspan(x-width/2, x+width/2, facecolor='red', alpha=0.2, zorder=1)
+        span = self.graph_ax.axvspan(x-width/2, x+width/2, facecolor='red', alpha=0.2, zorder=1)
+        self.graph_blitter.add_axes_artist(span)
 
     def draw_graph_arrow(self, x: int, height: int):
         # Draw the arrow
-        y_min = min(min(y) for y in self.sensor_values.values())
-        self.graph_ax.annotate('',
+        y_min, _ = self.graph_y_range.get_limits()
+        arrow = self.graph_ax.annotate('',
                                xy=(x, y_min),
                                xytext=(x, y_min + height),
                                arrowprops=dict(arrowstyle='->',
                                                color='r',
                                                linewidth=2))
+        self.graph_blitter.add_axes_artist(arrow)
 
     def add_alarm_text(self) -> None:
         current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -254,35 +398,42 @@ class App(tk.Tk):
         frame.grid(row=self.body_row, column=2, padx=10, pady=5)
         self.control_frame = frame  # save the frame
 
-    def create_graph(self) -> None:
-        gf = tk.Frame(self.body_frame)
-        gf.grid(row=self.body_row, column=1, padx=10, pady=5)
-        self.graph_frame = gf  # remember the object
-        sensor_names: list[str] = ui_config.ElementNames.sensor_names.value
+    def create_figure(self) -> tuple:
+        """ Figure with one line per sensor, independent of the window """
         fig = Figure(figsize=self.graph_size, dpi=100)
         ax = fig.add_subplot(111)
         ax.set_xlabel("Num of Data")
         ax.set_ylabel("Distance")
         ax.set_title("Sensors Data")
         lim: int = ui_config.Measurements.graph_x_limit.value
-        for sensor_name in sensor_names:
+        for sensor_name in self.sensor_buffer.sensor_names:
             x, y = self.get_axes_values(sensor_name, upper_limit=lim, lower_limit=None)
             line, = ax.plot(x, y, label=sensor_name)
             self.graph_lines.append(line)
         ax.legend()
+        self.figure = fig
+        self.graph_ax = ax
+        return fig, ax
+
+    def create_graph_blitter(self, canvas) -> GraphBlitter:
+        """ Only the lines are redrawn per frame, the axes are cached until the limits change
+        and the rest of the figure is cached until a resize
+        """
+        return GraphBlitter(canvas, animated_artists=self.graph_lines,
+                            axes_artists=[self.graph_ax.xaxis, self.graph_ax.yaxis])
+
+    def create_graph(self) -> None:
+        gf = tk.Frame(self.body_frame)
+        gf.grid(row=self.body_row, column=1, padx=10, pady=5)
+        self.graph_frame = gf  # remember the object
+        fig, ax = self.create_figure()
         canvas = FigureCanvasTkAgg(fig, master=self.graph_frame)
         canvas.draw()
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-
         self.graph_canvas = canvas
-        self.figure = fig
-        self.graph_ax = ax
 
-        self.func_ani = FuncAnimation(self.figure,
-                                      func=self.update_graph,
-                                      interval=100,
-                                      blit=False,
-                                      repeat=False)  # remember the object
+        self.graph_blitter = self.create_graph_blitter(canvas)
+        self.after(ui_config.Measurements.frame_interval.value, self.draw_frame)
 
         alarm_frame = tk.LabelFrame(self.graph_frame, text="Alarm Time", font=("Helvetica", 12))
         alarm_frame.pack(side=tk.BOTTOM, fill="x", pady=10)
@@ -292,15 +443,18 @@ class App(tk.Tk):
         def on_select_span(vmin: int, vmax: int):
             self.selected_span = (vmin, vmax)
             if self.span_rect:
+                self.graph_blitter.remove_axes_artist(self.span_rect)
                 self.span_rect.remove()
             self.span_rect = ax.add_patch(
                 Rectangle((vmin, ax.get_ylim()[0]), vmax - vmin, ax.get_ylim()[1] - ax.get_ylim()[0],
                           color='red', alpha=0.3))
-            self.graph_canvas.draw()
+            self.graph_blitter.add_axes_artist(self.span_rect)
 
         self.span_selector = SpanSelector(
             ax, on_select_span, "horizontal", useblit=True, minspan=0.1
         )
+        for artist in self.span_selector.artists:
+            self.graph_blitter.add_artist(artist)
 
     def save_selected_data(self):
         if self.selected_span is None:
@@ -310,65 +464,45 @@ class App(tk.Tk):
         start, end = self.selected_span
         print(f"Selected span: {start} to {end}")
 
-        data_dict = {'Time': []}
-        max_length = 0
-        for line in self.graph_lines:
-            sensor_name = line.get_label()
-            x = line.get_xdata()
-            y = line.get_ydata()
-            mask = (x >= start) & (x <= end)
-            mask_indices = np.where(mask)[0]
-            sensor_data = [y[i] for i in mask_indices if i < len(y)]
-            time_data = [self.sensor_time[i] for i in mask_indices if i < len(self.sensor_time)]
-            if len(sensor_data) > max_length:
-                max_length = len(sensor_data)
-            data_dict[sensor_name] = sensor_data
-            data_dict['Time'] = time_data
-
-        # Add Notes to all values
+        # The span is given in sample numbers, the same as the x-axis
+        lower, upper = int(np.ceil(start)), int(np.floor(end)) + 1
         notes: str = self.note_frame.get_notes()
-        data_dict["Notes"] = [notes for _ in range(max_length)]
-
-        # Ensure all lists in data_dict are of the same length by padding with NaN
-        for key in data_dict:
-            while len(data_dict[key]) < max_length:
-                data_dict[key].append(np.nan)
-
-        result_df = pd.DataFrame(data_dict)
         file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
         if file_path:
-            result_df.to_csv(file_path, index=False)
-            print(f"Data saved to {file_path}")
+            threading.Thread(target=self.export_range, args=(file_path, lower, upper, notes), daemon=True).start()
 
         # Remove notes frame
         self.note_frame.destroy()
 
+    def export_range(self, file_path: str, lower: int, upper: int, notes: str) -> None:
+        start = time.perf_counter()
+        samples_num = self.db_manager.export_range(file_path, self.get_data_source(), lower, upper, notes)
+        print(f"{samples_num} samples saved to {file_path} in {time.perf_counter() - start:.2f} s")
+
     def get_axes_values(self, sensor: str, upper_limit: Union[None, int], lower_limit=None) -> tuple:
         """
         Retrieves the x and y values for the specified sensor, with optional upper and lower limits.
 
         Args:
             sensor (str): The name of the sensor.
-            upper_limit (Union[None, int]): The upper limit for the number of data points to return. If `None`, all data points are returned.
-            lower_limit (Union[None, int], optional): The lower limit for the number of data points to return. If `None`, the lower limit is set to 0. Defaults to `None`.
+            upper_limit (Union[None, int]): The upper limit for the number of data points to return. If `None`, all data points kept in memory are returned.
+            lower_limit (Union[None, int], optional): The sample number to start from. If `None`, the last `upper_limit` data points are returned. Defaults to `None`.
 
         Returns:
-            Tuple[List[int], List[float]]: A tuple containing the x-axis values (list of integers) and the y-axis values (list of floats).
+            Tuple[np.ndarray, np.ndarray]: A tuple containing the x-axis values (sample numbers) and a view of the y-axis values in the sensor buffer.
         """
-        if not self.sensor_values.get(sensor):
+        buffer = self.get_data_source()
+        if lower_limit is not None and upper_limit is not None:
+            lower, upper = max(int(lower_limit), 0), min(int(upper_limit), buffer.total)
+            if upper - lower > ui_config.Measurements.graph_max_points.value:
+                return self.get_history_view(sensor, lower, upper)
+        if upper_limit is not None and lower_limit is None:
+            lower_limit, upper_limit = buffer.total - upper_limit, None
+        lower, upper = buffer.clip_range(lower_limit, upper_limit)
+        if lower == upper:
             return [0], [0]
-        x = list(range(len(self.sensor_values[sensor])))
-        y = self.sensor_values[sensor]
-        if upper_limit is None:
-            return x, y
-
-        if upper_limit and len(y) > upper_limit and lower_limit is None:
-            x = x[-upper_limit:]
-            y = y[-upper_limit:]
-            return x, y
-
-        x = x[lower_limit:upper_limit]
-        y = y[lower_limit:upper_limit]
+        x = np.arange(lower, upper)
+        y = buffer.get_sensor(sensor, lower, upper)
         return x, y
 
     def get_subplot_title(self):
@@ -393,6 +527,33 @@ class App(tk.Tk):
         clock.pack(fill="both", expand=True)
         self.info_panel_wnum += 1
 
+    def create_frame_rate_label(self, txt_frame: str) -> None:
+        labelframe = tk.LabelFrame(self.info_panel, text=txt_frame)
+        labelframe.grid(row=self.info_panel_wnum, column=0, padx=10, pady=5)
+        label = tk.Label(labelframe, text="0", font=("Helvetica", 48))
+        label.pack()
+        self.frame_rate_label = label
+        self.info_panel_wnum += 1
+        self.update_frame_rate_label()
+
+    def update_frame_rate_label(self) -> None:
+        self.frame_rate_label.config(text=f"{self.frame_timer.get_fps():.0f}")
+        self.after(1000, self.update_frame_rate_label)
+
+    def create_devices_label(self, txt_frame: str, get_stats: Callable[[], list[dict]]) -> None:
+        """ Throughput and dropped samples of every device, see AcquisitionManager.get_stats """
+        labelframe = tk.LabelFrame(self.info_panel, text=txt_frame)
+        labelframe.grid(row=self.info_panel_wnum, column=0, padx=10, pady=5)
+        label = tk.Label(labelframe, text="", font=("Helvetica", 12), justify=tk.LEFT)
+        label.pack()
+        self.info_panel_wnum += 1
+        self.update_devices_label(label, get_stats)
+
+    def update_devices_label(self, label: tk.Label, get_stats: Callable[[], list[dict]]) -> None:
+        label.config(text="\n".join(f"{stats['name']}: {stats['rate']:.0f}/s, {stats['dropped']} dropped"
+                                    for stats in get_stats()))
+        self.after(1000, self.update_devices_label, label, get_stats)
+
     def add_control_button(self, text: str, func: Callable) -> None:
         button = tk.Button(self.control_frame, text=text, command=func)
         button.grid(row=self.button_num, column=0, padx=10, pady=10)
@@ -448,7 +609,7 @@ class App(tk.Tk):
     """ Control functions """
 
     def set_user_photo(self, path=None):
-        photo_label: tk.Label = self.user_photo
+        """ A photo not in the memory cache is decoded and resized in the background, see show_user_photo """
         # The order of procedure should not be changed
         if path is None:
             path: str = self.db_manager.get_user_photo_path()
@@ -456,7 +617,26 @@ class App(tk.Tk):
             path: str = ui_config.FilePaths.user_photo_icon.value
         width: int = ui_config.Measurements.photo_w.value
         height: int = ui_config.Measurements.photo_h.value
-        img = TkCustomImage(path, w=width, h=height)
+        self.photo_path = path
+        try:
+            scaled_image = self.thumbnails.get_cached(path, width, height)
+        except OSError as e:
+            print(f"The photo could not be opened: {e}", file=sys.stderr)
+            return
+        if scaled_image is not None:
+            self.show_user_photo(path, scaled_image)
+            return
+        self.run_in_background(lambda: self.thumbnails.get(path, width, height),
+                               lambda image: self.show_user_photo(path, image))
+
+    def show_user_photo(self, path: str, scaled_image) -> None:
+        if scaled_image is None or path != self.photo_path:
+            return  # the photo could not be loaded or another one was requested since
+        img = TkCustomImage(path,
+                            w=ui_config.Measurements.photo_w.value,
+                            h=ui_config.Measurements.photo_h.value,
+                            scaled_image=scaled_image)
+        photo_label: tk.Label = self.user_photo
         photo_label.configure(image=img.tk_image)
         photo_label.image = img.tk_image
 
@@ -485,38 +665,85 @@ class App(tk.Tk):
         self.is_stopped = True
 
     def save_data(self):
+        """ The graph is saved at once, the CSV and the report are written in the background
+        Only the samples and the alarms since the sign-in are saved, the user may change before they are written
+        """
         self.save_graph()
-        self.db_manager.save_data(data=self.sensor_values, time=self.sensor_time)
+        session: SessionInstance = self.db_manager.session
+        values, times = self.sensor_buffer.load_history(lower=session.start_index)
+        alarm_times = session.alarm_log.get_times()
+        args = (values, times, alarm_times, session.user_id, self.db_manager.get_session_file_path(),
+                self.db_manager.report_writer.render())
+        threading.Thread(target=self.write_data, args=args, daemon=True).start()
+
+    def write_data(self, values: np.ndarray, times: np.ndarray, alarm_times: np.ndarray,
+                   user_id: int, session_path: str, report: str) -> None:
+        save_session_file(session_path, self.sensor_buffer.sensor_names, times, values,
+                          alarm_times=alarm_times, user_id=user_id)
+        self.db_manager.save_data(data=self.sensor_buffer.to_dict(values),
+                                  time=format_times(times, ui_config.Measurements.time_format.value),
+                                  user_id=user_id, report=report)
+
+    def get_rate_stats(self) -> dict:
+        """ Rate and jitter of the samples kept in memory """
+        return get_rate_stats(self.sensor_buffer.get_times())
+
+    def run_in_background(self, func: Callable, on_done: Callable, check_interval=20) -> None:
+        """ Call func in a worker thread and on_done(result) in the thread of the window,
+        so the graph keeps updating while func runs; the result is None if func failed
+        """
+        result = dict()
+
+        def target():
+            try:
+                result["value"] = func()
+            except Exception as e:
+                print(f"Background task failed: {e}", file=sys.stderr)
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+
+        def check():
+            if thread.is_alive():
+                self.after(check_interval, check)
+            else:
+                on_done(result.get("value"))
+        self.after(check_interval, check)
 
     def sign_in(self):
+        """ The password is checked in the background, see finish_sign_in """
+        if self.is_checking_password:
+            return
         pop_up: UserDetailsWindow = self.sign_in_popup
         user_details: UserDetails = pop_up.get_entered_details()
-        if not self.db_manager.is_valid_sign_in(details=user_details):
+        self.is_checking_password = True
+        self.run_in_background(lambda: self.db_manager.check_sign_in(details=user_details),
+                               lambda user_id: self.finish_sign_in(pop_up, user_details, user_id))
+
+    def finish_sign_in(self, pop_up: UserDetailsWindow, user_details: UserDetails, user_id: Union[int, None]):
+        """ The session is only changed here, in the thread of the window which reads it """
+        self.is_checking_password = False
+        if not pop_up.winfo_exists():
+            return  # the popup was closed during the check
+        if user_id is None:
             pop_up.show_message_frame(subject="Error",
                                       details="Entered details do not match the details in the database")
             return
+        self.db_manager.session.update(user_id, user_details, start_index=self.sensor_buffer.total)
         pop_up.show_message_frame(subject="Success",
                                   details=f"Welcome back, {self.db_manager.session.user_details.get_full_name()}")
         self.set_user_photo()
 
-        print(f"Checking if file exists at path: {self.csv_path}")
-        if os.path.exists(self.csv_path):
-            print(f"File found at path: {self.csv_path}")
-            self.user_data = self.load_user_data(self.csv_path)
-            print(f"User data loaded: {self.user_data.head()}")
-
-            print(f"User details: {self.db_manager.session.user_details.__dict__}")
-
-            user_info = {
-                'Age': self.db_manager.session.user_details.age,
-                'Shoulder Size': self.db_manager.session.user_details.shoulder_size,
-                'Height': self.db_manager.session.user_details.height,
-                'Weight': self.db_manager.session.user_details.weight
-            }
-            self.current_user_features = self.process_user_info(user_info)
-            print(f"User features loaded and set: {self.current_user_features}")
-        else:
-            print(f"File not found at path: {self.csv_path}")
+        # the details are already read from the user database by check_sign_in
+        print(f"User details: {self.db_manager.session.user_details.__dict__}")
+        user_info = {
+            'Age': self.db_manager.session.user_details.age,
+            'Shoulder Size': self.db_manager.session.user_details.shoulder_size,
+            'Height': self.db_manager.session.user_details.height,
+            'Weight': self.db_manager.session.user_details.weight
+        }
+        self.current_user_features = self.process_user_info(user_info)
+        print(f"User features loaded and set: {self.current_user_features}")
 
         # Change button config
         sign_in_button: tk.Button = self.control_buttons[ui_config.ElementNames.sign_in_button_txt.value]
@@ -532,7 +759,7 @@ class App(tk.Tk):
 
     def sign_out(self):
         # Forget session
-        self.db_manager.session.reset()
+        self.db_manager.session.reset(start_index=self.sensor_buffer.total)
         self.set_user_photo()
 
         self.current_user_features = None
@@ -546,9 +773,19 @@ class App(tk.Tk):
         self.user_name.destroy()
 
     def register_user(self):
+        """ The password is hashed in the background, see finish_registration """
+        if self.is_checking_password:
+            return
         popup: UserRegistrationWindow = self.registration_popup
         user_details: UserDetails = popup.get_entered_details()
-        saved: bool = self.db_manager.save_user(user_details)
+        self.is_checking_password = True
+        self.run_in_background(lambda: self.db_manager.save_user(user_details),
+                               lambda saved: self.finish_registration(popup, saved))
+
+    def finish_registration(self, popup: UserRegistrationWindow, saved: bool):
+        self.is_checking_password = False
+        if not popup.winfo_exists():
+            return
         if saved:
             popup.show_message_frame(subject="Success",
                                      details="Your personal details has been saved!\n"
@@ -571,8 +808,10 @@ class App(tk.Tk):
         # Add scroll bar for the Graph
         self.scroll_bar_frame = tk.Frame(self.body_frame)
         self.scroll_bar_frame.grid(row=3, column=1, pady=10, padx=10, sticky=tk.NSEW)
+        source = self.get_data_source()
         self.graph_scroll_bar = GraphScrollBar(parent=self.scroll_bar_frame,
-                                               options=self.sensor_time,
+                                               options=range(source.first_index, source.total),
+                                               window=ui_config.Measurements.graph_max_points.value,
                                                figure_func=self.update_graph)
 
     def resume(self):
@@ -583,14 +822,77 @@ class App(tk.Tk):
         if self.scroll_bar_frame:
             self.graph_scroll_bar.destroy()
             self.scroll_bar_frame.destroy()
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+            self.history_pyramid = None
+
+    def get_history_view(self, sensor: str, lower: int, upper: int) -> tuple:
+        """ Long ranges are drawn as the min and max of the buckets of samples,
+        so the number of points does not depend on the length of the range
+        """
+        source = self.get_data_source()
+        pyramid = self.history_pyramid if self.history is not None else self.lod_pyramid
+        if pyramid is None:
+            # the pyramid of the opened session is still being built, every step-th sample is drawn meanwhile
+            step = -(-(upper - lower) // ui_config.Measurements.graph_max_points.value)
+            y = source.get_sensor(sensor, lower, upper)[::step]
+            return np.arange(lower, upper, step)[:len(y)], y
+        return pyramid.get_view(source.sensor_names.index(sensor), lower, upper,
+                                max_points=ui_config.Measurements.graph_max_points.value,
+                                read_raw=lambda start, stop: source.get_sensor(sensor, start, stop))
+
+    def get_data_source(self) -> Union[SensorBuffer, SessionFile]:
+        """ The opened session while it is shown, otherwise the live data """
+        return self.history if self.history is not None else self.sensor_buffer
+
+    def open_session(self, path=None) -> None:
+        """ Show a saved session, only the visible range is read from the file """
+        if path is None:
+            path = filedialog.askopenfilename(initialdir=ui_config.FilePaths.values_folder_path.value,
+                                              filetypes=[("Session files", "*.session")])
+        if not path:
+            return
+        session = SessionFile(path)
+        if session.sensor_names != self.sensor_buffer.sensor_names:
+            print(f"The session has the sensors {session.sensor_names}, "
+                  f"the graph shows {self.sensor_buffer.sensor_names}", file=sys.stderr)
+            return
+        if self.is_paused:
+            self.resume()
+        self.history = session
+        self.history_pyramid = None
+        self.pause()  # the scroll bar draws the end of the session
+        print(f"Opened {path}: {session.total} samples")
+        # the whole file is scanned for the pyramid, so it is built in the background from its own mapping
+        self.run_in_background(lambda: self.build_session_pyramid(path),
+                               on_done=lambda pyramid: self.set_history_pyramid(session, pyramid))
+
+    @staticmethod
+    def build_session_pyramid(path: str) -> MinMaxPyramid:
+        session = SessionFile(path)
+        try:
+            return MinMaxPyramid.from_source(session)
+        finally:
+            session.close()
+
+    def set_history_pyramid(self, session: SessionFile, pyramid: Union[MinMaxPyramid, None]) -> None:
+        """ Redraw the session with the pyramid if it is still shown """
+        if pyramid is None or self.history is not session:
+            return
+        self.history_pyramid = pyramid
+        if self.graph_scroll_bar is not None:
+            self.graph_scroll_bar.request_redraw()
 
     def save_graph(self):
         file_path = self.db_manager.get_graph_save_path()
-        self.figure.savefig(file_path)
+        with self.graph_blitter.static_artists():
+            self.figure.savefig(file_path)
         print(f"Graph saved to {file_path}")
 
     @staticmethod
-    def load_user_data(filepath: str) -> Union[pd.DataFrame, None]:
+    def load_user_data(filepath: str) -> Union['pd.DataFrame', None]:
+        import pandas as pd
         try:
             data = pd.read_csv(filepath)
             print(f"CSV data loaded successfully from {filepath}")
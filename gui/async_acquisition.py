@@ -0,0 +1,349 @@
+""" asyncio alternative to AcquisitionManager
+Every device is a pipeline of async stages connected by bounded queues:
+    read -> parse -> filter -> (detect) -> sinks
+The reader wakes up when the port has data (loop.add_reader), the stages run as tasks of one event loop,
+the blocking detection runs in an executor, with all batches waiting for it in one call
+as in DetectionWorker, so its cost per call does not limit the rate. A full queue makes the previous stage wait;
+only the reader never waits, it drops the oldest batch and counts it, so the device is never blocked.
+While is_paused() of a device returns True, e.g. the window is paused, the reader drops the lines it reads.
+The loop runs in its own thread next to the Tk loop (start()), or alone without the window (main()).
+
+Usage without the window (Linux/macOS, with serial_replay.py):
+    python async_acquisition.py /dev/pts/3 /dev/pts/5 --duration 60 --log --model ../model_all.h5
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Union
+import numpy as np
+import serial
+import ui_config
+from serial_manager import SerialLineReader
+from data_parser import parse_lines, replace_outliers, DEFAULT_VALUE
+from perf_metrics import LatencyRecorder
+from sample_queue import SampleQueue
+from session_log import SessionLogWriter, create_session_log
+
+Stage = Callable[[tuple], Awaitable[Union[tuple, None]]]  # returns the item for the next stage, None to stop it
+BatchStage = Callable[[list[tuple]], Awaitable[list[tuple]]]  # all waiting items at once
+
+
+class SerialStream:
+    """ Reads of the serial port which wait in the event loop instead of a thread
+    On Windows the ports can not be watched by the loop, there the blocking read runs in the executor
+    """
+    def __init__(self, ser: serial.Serial, max_read=65536):
+        self.ser = ser
+        self.max_read = max_read
+        self.is_closed = False
+        self.loop = asyncio.get_running_loop()
+        self.data_ready = asyncio.Event()
+        self.fd = ser.fileno() if sys.platform != "win32" else None
+        if self.fd is not None:
+            self.loop.add_reader(self.fd, self.data_ready.set)
+
+    async def read(self) -> bytes:
+        """ Bytes received so far, b"" once the stream is closed """
+        while not self.is_closed:
+            if self.fd is None:
+                data = await self.loop.run_in_executor(None, self.read_now)
+            else:
+                data = self.read_now()  # the port is opened with timeout=0
+            if data:
+                return data
+            if self.fd is not None:
+                self.data_ready.clear()
+                await self.data_ready.wait()
+        return b""
+
+    def read_now(self) -> bytes:
+        return self.ser.read(min(max(1, self.ser.in_waiting), self.max_read))
+
+    def close(self) -> None:
+        if self.is_closed:
+            return
+        self.is_closed = True
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+        self.data_ready.set()
+        self.ser.close()
+
+
+class Pipeline:
+    """ Chain of stages, every stage is a task reading its input queue of queue_size items """
+    def __init__(self, name: str, queue_size=64):
+        self.name = name
+        self.queue_size = queue_size
+        self.stages = list()  # (name, stage, is_batch)
+        self.latency = LatencyRecorder()  # per stage and "end_to_end", from the receipt to the sinks
+        self.dropped_num = 0  # samples dropped by the reader
+
+    def add_stage(self, name: str, stage: Union[Stage, BatchStage], is_batch=False) -> 'Pipeline':
+        """ A batch stage gets every item waiting in its queue as a list and returns the items for the next one """
+        self.stages.append((name, stage, is_batch))
+        return self
+
+    async def run(self, source: AsyncIterator[tuple]) -> None:
+        """ Until the source ends; the items already read go through all stages before the return """
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        tasks = [asyncio.create_task(self.run_stage(name, stage, is_batch, queues[i],
+                                                    queues[i + 1] if i + 1 < len(queues) else None))
+                 for i, (name, stage, is_batch) in enumerate(self.stages)]
+        try:
+            async for item in source:
+                if queues[0].full():
+                    dropped = queues[0].get_nowait()
+                    self.dropped_num += len(dropped[0])
+                queues[0].put_nowait(item)
+        finally:
+            await queues[0].put(None)
+            await asyncio.gather(*tasks)
+
+    async def run_stage(self, name: str, stage: Union[Stage, BatchStage], is_batch: bool, inbox: asyncio.Queue,
+                        outbox: Union[asyncio.Queue, None]) -> None:
+        is_finished = False
+        while not is_finished:
+            items = [await inbox.get()]
+            while is_batch and not inbox.empty():
+                items.append(inbox.get_nowait())
+            if items[-1] is None:
+                is_finished = True
+                items.pop()
+            if items:
+                start = time.perf_counter()
+                try:
+                    items = await stage(items) if is_batch else [await stage(items[0])]
+                except Exception as e:
+                    print(f"{self.name}: {name} failed: {e}", file=sys.stderr)
+                    items = []  # only these items are lost, the pipeline keeps running
+                self.latency.add(name, time.perf_counter() - start)
+            if outbox is None:
+                continue
+            for item in items:
+                if item is not None:
+                    await outbox.put(item)
+        if outbox is not None:
+            await outbox.put(None)
+
+
+class AsyncDevice:
+    """ Parser state, consumers and counters of one port, the stages of its pipeline are its methods
+    The items are (lines, receipt time) before the parse stage and (values, receipt time) after it
+    """
+    def __init__(self, name: str, ser: serial.Serial, sensors_num: int,
+                 queue: Union[SampleQueue, None] = None, log: Union[SessionLogWriter, None] = None, recorder=None,
+                 detector=None, user_features=None, executor=None, columns=(0, 1), queue_size=64,
+                 is_paused: Union[Callable[[], bool], None] = None):
+        self.name = name
+        self.ser = ser
+        self.splitter = SerialLineReader(ser, recorder=recorder)
+        self.queue = queue
+        self.log = log
+        self.is_paused = is_paused
+        self.detector = detector  # posture_model.PostureDetector, the detection is skipped without it
+        self.user_features = user_features
+        self.executor = executor
+        self.columns = columns  # of Sensor 2 and Sensor 4, the inputs of the detection
+        self.last_values = [DEFAULT_VALUE] * sensors_num
+        self.stream = None
+        self.samples_num = 0
+        self.rejected_num = 0
+        self.paused_num = 0  # lines dropped while paused
+        self.alarms_num = 0
+        self.last_stats = (time.monotonic(), 0)
+        self.pipeline = Pipeline(name, queue_size)
+        self.pipeline.add_stage("parse", self.parse).add_stage("filter", self.filter)
+        if detector is not None:
+            self.pipeline.add_stage("detect", self.detect, is_batch=True)
+        self.pipeline.add_stage("sink", self.sink)
+
+    async def read_lines(self) -> AsyncIterator[tuple]:
+        while True:
+            data = await self.stream.read()
+            if not data:
+                return
+            lines = self.splitter.add_data(data)
+            if lines and self.is_paused is not None and self.is_paused():
+                self.paused_num += len(lines)
+            elif lines:
+                yield lines, time.time_ns()
+
+    async def run(self) -> None:
+        self.stream = SerialStream(self.ser)
+        try:
+            await self.pipeline.run(self.read_lines())
+        except (serial.SerialException, OSError) as e:
+            print(f"{self.name} is disconnected: {e}")
+        finally:
+            self.close()
+
+    async def parse(self, item: tuple) -> Union[tuple, None]:
+        lines, timestamp = item
+        values, rejected = parse_lines(lines)
+        self.rejected_num += rejected
+        return (values, timestamp) if len(values) else None
+
+    async def filter(self, item: tuple) -> tuple:
+        values, timestamp = item
+        values = replace_outliers(values, self.last_values)
+        self.last_values = values[-1]
+        return values, timestamp
+
+    async def detect(self, items: list[tuple]) -> list[tuple]:
+        """ All waiting batches are scored in one call, the items go on unchanged """
+        from posture_model import is_alarm
+        if self.user_features is not None:
+            values = np.concatenate([values for values, _ in items])
+            column_2, column_4 = self.columns
+            predictions = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.detector.score, values[:, column_2].astype(float),
+                values[:, column_4].astype(float), self.user_features)
+            self.alarms_num += int(np.count_nonzero(is_alarm(predictions)))
+        return items
+
+    async def sink(self, item: tuple) -> None:
+        values, timestamp = item
+        if self.queue is not None:
+            self.queue.publish(values, timestamp)
+        if self.log is not None:
+            self.log.append(values, timestamp)
+        self.samples_num += len(values)
+        self.pipeline.latency.add("end_to_end", (time.time_ns() - timestamp) / 1e9)
+
+    def get_stats(self) -> dict:
+        """ The same fields as acquisition_manager.Device.get_stats """
+        now = time.monotonic()
+        last_time, last_samples = self.last_stats
+        self.last_stats = (now, self.samples_num)
+        return {"name": self.name,
+                "rate": round((self.samples_num - last_samples) / max(now - last_time, 1e-9), 1),
+                "samples": self.samples_num,
+                "bytes": self.splitter.bytes_num,
+                "rejected": self.rejected_num,
+                "paused": self.paused_num,
+                "dropped": self.pipeline.dropped_num + (self.queue.dropped_num if self.queue is not None else 0)}
+
+    def close(self) -> None:
+        if self.stream is not None:
+            self.stream.close()
+        else:
+            self.ser.close()
+        if self.log is not None:
+            self.log.close()
+        if self.splitter.recorder is not None:
+            self.splitter.recorder.close()
+
+
+class AcquisitionEngine:
+    """ The same methods as AcquisitionManager: add_device(), start(), stop(), get_stats() """
+    def __init__(self, queue_size=64):
+        self.devices = list()
+        self.queue_size = queue_size  # items (reads of a port) per stage
+        self.loop = None
+        self.stop_event = None
+        self.thread = None
+
+    def add_device(self, port: str, sensors_num: int, queue: Union[SampleQueue, None] = None,
+                   log: Union[SessionLogWriter, None] = None, recorder=None, **kwargs) -> Union[AsyncDevice, None]:
+        """ Open the port, None if it can not be opened; kwargs are is_paused and the detection options """
+        try:
+            ser = serial.Serial(port, ui_config.Measurements.serial_baudrate.value,
+                                timeout=0 if sys.platform != "win32" else ui_config.Measurements.serial_timeout.value)
+        except serial.SerialException as e:
+            print(f"Error opening serial port: {e}")
+            return None
+        device = AsyncDevice(port, ser, sensors_num, queue=queue, log=log, recorder=recorder,
+                             queue_size=self.queue_size, **kwargs)
+        self.devices.append(device)
+        return device
+
+    async def run(self, duration: Union[float, None] = None) -> None:
+        """ Until stop() or the end of the duration (s) """
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        tasks = [asyncio.create_task(device.run()) for device in self.devices]
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=duration)
+        except asyncio.TimeoutError:
+            pass
+        for device in self.devices:
+            if device.stream is not None:
+                device.stream.close()  # the pipelines finish the items already read
+        await asyncio.gather(*tasks)
+        print("Data Parsing has been stopped")
+
+    def start(self) -> None:
+        """ Run the event loop in its own thread, e.g. next to the Tk loop """
+        self.thread = threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        self.thread.start()
+        while self.stop_event is None and self.thread.is_alive():
+            time.sleep(0.001)  # until the loop has started
+
+    def stop(self) -> None:
+        if self.loop is not None and self.stop_event is not None and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                pass  # the loop has just finished
+        if self.thread is not None and self.thread.is_alive():
+            self.thread.join()
+
+    def get_stats(self) -> list[dict]:
+        return [device.get_stats() for device in list(self.devices)]
+
+    def get_latency(self) -> dict:
+        """ {device: LatencyRecorder summary of its stages} """
+        return {device.name: device.pipeline.latency.get_summary() for device in self.devices}
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description="Read the devices with asyncio and print their throughput")
+    parser.add_argument("ports", nargs="+")
+    parser.add_argument("--duration", type=float, default=10.0, help="s")
+    parser.add_argument("--log", action="store_true", help="write the session log of every device")
+    parser.add_argument("--model", default=None, help="score the samples with the model, e.g. ../model_all.h5")
+    parser.add_argument("--features", type=float, nargs=5, default=None,
+                        help="age, shoulder size, weight, height, flexibility of the wearer for the detection")
+    options = parser.parse_args(args)
+
+    sensor_names: list[str] = ui_config.ElementNames.sensor_names.value
+    detection = dict()
+    if options.model:
+        from concurrent.futures import ThreadPoolExecutor
+        from posture_model import PostureDetector, load_predict, warm_up
+        predict = load_predict(options.model, ui_config.FilePaths.model_cache_path.value)
+        warm_up(predict)
+        features = options.features or [30, 1, 60, 170, 10]
+        detection = {"detector": PostureDetector(predict),
+                     "columns": (sensor_names.index("Sensor 2"), sensor_names.index("Sensor 4")),
+                     "user_features": np.array(features, dtype=float),
+                     "executor": ThreadPoolExecutor(max_workers=1)}
+    engine = AcquisitionEngine()
+    for port in options.ports:
+        log = create_session_log(sensor_names, suffix="_" + port.replace("/dev/", "").replace("/", "")) \
+            if options.log else None
+        engine.add_device(port, len(sensor_names), log=log, **detection)
+
+    async def report() -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            print(engine.get_stats())
+
+    async def run() -> None:
+        reporter = asyncio.get_running_loop().create_task(report())
+        await engine.run(options.duration)
+        reporter.cancel()
+
+    asyncio.run(run())
+    for device in engine.devices:
+        summary = device.pipeline.latency.get_summary()
+        print(f"{device.name}: {device.samples_num} samples, {device.alarms_num} alarms, "
+              f"end to end p50 {summary.get('end_to_end', {}).get('p50_ms')} ms, "
+              f"p99 {summary.get('end_to_end', {}).get('p99_ms')} ms")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
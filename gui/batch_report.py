@@ -0,0 +1,196 @@
+""" Usage and alarm reports of all users over all saved sessions
+Every session file (session_file.py) of the values folder is one session of the user in its header.
+Only the timestamps at the ends and the alarm times are read from every file,
+the report of every user is rendered in its own process.
+Writes report_<user id>.md for every user and summary.md for all of them to the output folder.
+
+Usage:
+    python batch_report.py --output data/reports/batch --since 2024-06-01 --workers 4
+"""
+
+import os
+import sys
+import time
+import argparse
+import datetime
+from typing import Union
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import ui_config
+from session_file import SessionFile, read_header
+from alarm_log import AlarmLog
+
+
+def find_sessions(folder: str, since: Union[datetime.datetime, None] = None) -> dict[int, list[str]]:
+    """ {user id: paths of the session files}, only the headers are read
+    The files without the user id in the header are given to the id in their name, e.g. 3_20240601_101500.session
+    """
+    sessions = dict()
+    for entry in sorted(os.scandir(folder), key=lambda entry: entry.name):
+        if not entry.name.endswith(".session"):
+            continue
+        if since is not None and entry.stat().st_mtime < since.timestamp():
+            continue  # saved before the period of the report
+        try:
+            user_id = read_header(entry.path).get("user_id")
+        except (OSError, ValueError) as e:
+            print(f"Skipped {entry.path}: {e}", file=sys.stderr)
+            continue
+        if user_id is None:
+            prefix = entry.name.split("_")[0].split(".")[0]
+            if not prefix.lstrip("-").isdigit():
+                continue
+            user_id = int(prefix)
+        sessions.setdefault(user_id, []).append(entry.path)
+    return sessions
+
+
+def get_session_stats(path: str) -> Union[dict, None]:
+    """ Start, duration, number of samples and the alarms of the session, None if it has no samples """
+    session = SessionFile(path)
+    try:
+        if len(session) == 0:
+            return None
+        start = int(session.times[0])
+        end = int(session.times[-1])
+        alarm_times = np.array(session.alarm_times, dtype=np.int64)
+    finally:
+        session.close()
+    start_time = datetime.datetime.fromtimestamp(start / 1e9)
+    # hour of the day of every alarm in the local time of the start of the session
+    utc_offset = start_time.astimezone().utcoffset().total_seconds()
+    alarm_hours = (alarm_times // 1_000_000_000 + int(utc_offset)) // 3600 % 24
+    alarm_log = AlarmLog.from_times(alarm_times, max_gap=ui_config.Measurements.alarm_episode_gap.value)
+    return {"path": path,
+            "start": start_time,
+            "duration_s": (end - start) / 1e9,
+            "samples_num": len(session),
+            "alarms_num": len(alarm_times),
+            "episodes_num": alarm_log.episodes_num,
+            "alarm_time_s": alarm_log.get_total_time(),
+            "longest_episode_s": alarm_log.get_longest_episode(),
+            "alarms_per_hour": np.bincount(alarm_hours, minlength=24)}
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def render_user_report(user_id: int, user: Union[dict, None], sessions: list[dict]) -> str:
+    name = " ".join(str(user[header]) for header in ("First Name", "Middle Name", "Second Name")
+                    if user[header]) if user else "Unknown"
+    usage_s = sum(session["duration_s"] for session in sessions)
+    alarms_num = sum(session["alarms_num"] for session in sessions)
+    longest_episode_s = max((session["longest_episode_s"] for session in sessions), default=0.0)
+    lines = ["# User Report",
+             f"Usage and alarms of {len(sessions)} sessions",
+             "## User Details:",
+             f"| Name | {name} |",
+             "| --- | --- |",
+             f"| User ID | {user_id} |",
+             f"| Total Usage Time | {format_duration(usage_s)} |",
+             f"| Alarms | {alarms_num} |",
+             f"| Alarms per Hour of Usage | {alarms_num / usage_s * 3600 if usage_s else 0.0:.1f} |",
+             f"| Alarm Episodes | {sum(session['episodes_num'] for session in sessions)} |",
+             f"| Alarm Total Time | {format_duration(sum(session['alarm_time_s'] for session in sessions))} |",
+             f"| Longest Episode | {longest_episode_s:.1f} s |"]
+    if user:
+        lines += [f"| {header} | {user[header]} |" for header in ("Age", "Gender", "Shoulder Size", "Weight", "Height")]
+    lines += ["## Sessions:",
+              "| Start | Duration | Samples | Alarms | Episodes | Alarm Time |",
+              "| --- | --- | --- | --- | --- | --- |"]
+    lines += [f"| {session['start']:%Y-%m-%d %H:%M:%S} | {format_duration(session['duration_s'])} "
+              f"| {session['samples_num']} | {session['alarms_num']} | {session['episodes_num']} "
+              f"| {format_duration(session['alarm_time_s'])} |" for session in sessions]
+    lines += ["## Alarm Timeline:",
+              "| Date | Usage | Alarms |",
+              "| --- | --- | --- |"]
+    days = dict()
+    for session in sessions:
+        day = days.setdefault(session["start"].date(), [0.0, 0])
+        day[0] += session["duration_s"]
+        day[1] += session["alarms_num"]
+    lines += [f"| {day} | {format_duration(usage)} | {alarms} |" for day, (usage, alarms) in sorted(days.items())]
+    alarms_per_hour = np.sum([session["alarms_per_hour"] for session in sessions], axis=0) if sessions \
+        else np.zeros(24, dtype=np.int64)  # only sessions without samples
+    lines += ["## Alarms by Hour of the Day:",
+              "| Hour | Alarms |",
+              "| --- | --- |"]
+    lines += [f"| {hour:02d}:00 | {alarms} |" for hour, alarms in enumerate(alarms_per_hour) if alarms]
+    return "\n".join(lines) + "\n"
+
+
+def write_user_report(user_id: int, user: Union[dict, None], paths: list[str], output_folder: str) -> dict:
+    """ Runs in the worker process
+    :returns summary of the user for summary.md
+    """
+    sessions = [stats for stats in map(get_session_stats, paths) if stats is not None]
+    sessions.sort(key=lambda session: session["start"])
+    report_path = os.path.join(output_folder, f"report_{user_id}.md")
+    with open(report_path, "w", encoding="utf-8") as file:
+        file.write(render_user_report(user_id, user, sessions))
+    return {"user_id": user_id,
+            "name": " ".join(str(user[header]) for header in ("First Name", "Second Name")) if user else "Unknown",
+            "sessions_num": len(sessions),
+            "usage_s": sum(session["duration_s"] for session in sessions),
+            "alarms_num": sum(session["alarms_num"] for session in sessions),
+            "report_path": report_path}
+
+
+def render_summary(summaries: list[dict]) -> str:
+    lines = ["# Summary of All Users",
+             f"Created {datetime.datetime.now():%Y-%m-%d %H:%M}",
+             "| User ID | Name | Sessions | Usage | Alarms | Report |",
+             "| --- | --- | --- | --- | --- | --- |"]
+    lines += [f"| {summary['user_id']} | {summary['name']} | {summary['sessions_num']} "
+              f"| {format_duration(summary['usage_s'])} | {summary['alarms_num']} "
+              f"| [{os.path.basename(summary['report_path'])}]({os.path.basename(summary['report_path'])}) |"
+              for summary in summaries]
+    return "\n".join(lines) + "\n"
+
+
+def write_reports(values_folder: str, output_folder: str, since=None, workers=None) -> list[dict]:
+    """ :returns summaries of the users, ordered by the user id
+    workers=1 writes the reports in this process
+    """
+    from user_store import UserStore
+    os.makedirs(output_folder, exist_ok=True)
+    sessions = find_sessions(values_folder, since)
+    store = UserStore(ui_config.FilePaths.user_db_path.value, csv_path=ui_config.FilePaths.user_login_db_path.value)
+    users = store.get_all()
+    store.close()
+    user_ids = sorted(sessions)
+    tasks = (user_ids,
+             [users.get(user_id) for user_id in user_ids],
+             [sessions[user_id] for user_id in user_ids],
+             [output_folder] * len(user_ids))
+    if workers == 1:
+        summaries = list(map(write_user_report, *tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            summaries = list(executor.map(write_user_report, *tasks))
+    with open(os.path.join(output_folder, "summary.md"), "w", encoding="utf-8") as file:
+        file.write(render_summary(summaries))
+    return summaries
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description="Write the usage and alarm reports of all users")
+    parser.add_argument("--folder", default=ui_config.FilePaths.values_folder_path.value,
+                        help="folder of the session files")
+    parser.add_argument("--output", default=ui_config.FilePaths.reports_folder_path.value + "/batch")
+    parser.add_argument("--since", default=None, help="YYYY-MM-DD, only the sessions saved since the date")
+    parser.add_argument("--workers", type=int, default=None, help="processes, the number of CPUs by default")
+    options = parser.parse_args(args)
+
+    since = datetime.datetime.strptime(options.since, "%Y-%m-%d") if options.since else None
+    start = time.perf_counter()
+    summaries = write_reports(options.folder, options.output, since, options.workers)
+    sessions_num = sum(summary["sessions_num"] for summary in summaries)
+    print(f"Reports of {len(summaries)} users ({sessions_num} sessions) written to {options.output} "
+          f"in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
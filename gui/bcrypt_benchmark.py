@@ -0,0 +1,38 @@
+""" Time of the bcrypt check of one password for every work factor,
+to choose Measurements.bcrypt_rounds for the computer the app runs on.
+A sign-in takes one check; the hashes keep their own work factor,
+so a new value applies to the users registered after the change.
+Run: python bcrypt_benchmark.py [lowest rounds] [highest rounds] [repeats]
+"""
+
+import sys
+import bcrypt
+import ui_config
+from perf_metrics import LatencyRecorder
+
+
+def measure(rounds: int, repeats: int) -> dict:
+    """ {"hash_password": {...}, "verify_password": {...}} of LatencyRecorder.get_summary() """
+    latency = LatencyRecorder()
+    password = b"benchmark password"
+    for _ in range(repeats):
+        with latency.measure("hash_password"):
+            hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+        with latency.measure("verify_password"):
+            bcrypt.checkpw(password, hashed)
+    return latency.get_summary()
+
+
+def main(args: list[str]):
+    lowest = int(args[0]) if len(args) > 0 else 10
+    highest = int(args[1]) if len(args) > 1 else 14
+    repeats = int(args[2]) if len(args) > 2 else 3
+    print(f"Current bcrypt_rounds: {ui_config.Measurements.bcrypt_rounds.value}")
+    print("rounds\tverify p50 (ms)\tverify max (ms)")
+    for rounds in range(lowest, highest + 1):
+        summary = measure(rounds, repeats)["verify_password"]
+        print(f"{rounds}\t{summary['p50_ms']:.0f}\t\t{summary['max_ms']:.0f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
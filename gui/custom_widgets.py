@@ -2,7 +2,6 @@ import tkinter as tk
 from typing import Callable
 from datetime import datetime
 from datetime import timedelta
-from PIL import Image, ImageTk
 import ui_config
 from database_manager import UserDetails
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
@@ -13,10 +12,18 @@ class TkCustomImage:
     1. Original image as np.array
     2. Scaled image as np.array
     3. Tk image of scaled image
+    With a thumbnail cache the scaled image is taken from it and the original image is not kept
     """
-    def __init__(self, file_path: str, w: int, h: int):
-        self.original_image = Image.open(file_path)
-        self.scaled_image = self.original_image.resize((w, h), resample=Image.LANCZOS)
+    def __init__(self, file_path: str, w: int, h: int, cache=None, scaled_image=None):
+        from PIL import Image, ImageTk  # imported with the first image, not at the start of the app
+        self.original_image = None
+        if scaled_image is not None:
+            self.scaled_image = scaled_image  # e.g. loaded in the background by ThumbnailCache.get
+        elif cache is not None:
+            self.scaled_image = cache.get(file_path, w, h)
+        else:
+            self.original_image = Image.open(file_path)
+            self.scaled_image = self.original_image.resize((w, h), resample=Image.LANCZOS)
         self.tk_image: tk.PhotoImage = ImageTk.PhotoImage(image=self.scaled_image)
 
     def attach_image(self, master, row: int, col: int) -> tk.Label:
@@ -280,49 +287,68 @@ class NotesEntryFrame(tk.Frame):
 
 
 class GraphScrollBar(tk.Scrollbar):
-    def __init__(self, parent, options: list[int], figure_func: Callable):
+    """ Horizontal scroll bar over the sample indices of options (a range)
+    The visible range is kept as numbers, so scrolling costs the same for any number of samples.
+    The mouse wheel over the bar zooms in and out around the centre of the visible range.
+    The graph is redrawn at most once per redraw_interval (ms) with the latest range
+    """
+    def __init__(self, parent, options: range, figure_func: Callable, window=None, redraw_interval=50):
         super().__init__(parent)
-        self.config(orient=tk.HORIZONTAL)
+        self.config(orient=tk.HORIZONTAL, command=self.on_scroll)
         self.pack(side=tk.TOP, fill=tk.X, expand=True)
-        self.list_box = self.add_listbox(parent, options)
-        self.config(command=self.list_box.xview)
-        self.bind('<Motion>', self.scroll_callback)
+        self.start = options.start
+        self.length = max(1, len(options))
+        self.window = self.length if window is None else min(max(1, window), self.length)
+        self.lower = self.start
         self.update_figure_func = figure_func
+        self.redraw_interval = redraw_interval
+        self.redraw_id = None
+        self.bind('<MouseWheel>', self.on_wheel)  # Windows, macOS
+        self.bind('<Button-4>', self.on_wheel)  # Linux
+        self.bind('<Button-5>', self.on_wheel)
         self.move_cursor_end()
 
-    def add_listbox(self, parent, options: list[int]):
-        box = tk.Listbox(parent, xscrollcommand=self.set, selectmode=tk.EXTENDED, height=2)
-        item_string = " ".join([str(option) for option in range(len(options))])
-        box.insert(tk.END, item_string)
-        box.config(background='#f0f0f0', bd=0, highlightthickness=0)
-        box.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        return box
-
-    def scroll_callback(self, event=None):
-        # Get the visible range of the Listbox
-        first, last = self.list_box.xview()
-        lower, upper = self.get_visible_range(lower_range=first,
-                                              upper_range=last)
+    def on_scroll(self, action: str, amount: str, unit=None):
+        """ Command of the scroll bar: ("moveto", fraction) or ("scroll", steps, "units" or "pages") """
+        if action == "moveto":
+            lower = self.start + float(amount) * self.length
+        elif unit == "pages":
+            lower = self.lower + int(amount) * self.window
+        else:
+            lower = self.lower + int(amount) * max(1, self.window // 10)
+        self.move_to(lower)
+
+    def on_wheel(self, event):
+        zoom_in = event.num == 4 or event.delta > 0
+        center = self.lower + self.window / 2
+        self.window = min(max(10, int(self.window * (0.8 if zoom_in else 1.25))), self.length)
+        self.move_to(center - self.window / 2)
+
+    def move_to(self, lower: float) -> None:
+        self.lower = int(min(max(lower, self.start), self.start + self.length - self.window))
+        first = (self.lower - self.start) / self.length
+        self.set(first, first + self.window / self.length)
+        self.request_redraw()
+
+    def get_visible_range(self) -> tuple:
+        """ :returns range of sample indices as a tuple(from_int, to_int) """
+        return self.lower, self.lower + self.window
+
+    def request_redraw(self) -> None:
+        if self.redraw_id is None:
+            self.redraw_id = self.after(self.redraw_interval, self.redraw)
+
+    def redraw(self) -> None:
+        self.redraw_id = None
+        lower, upper = self.get_visible_range()
         self.update_figure_func(event=None, lower_range=lower, upper_range=upper)
 
-    def get_visible_range(self, lower_range: float, upper_range: float) -> tuple:
-        """ The function determine which of the listbox elements are visible for the user
-        and figure to be updated
-        :returns range as a tuple(from_int, to_int)
-        """
-        string_options: str = self.list_box.get(0)
-        options: list[int] = [int(option) for option in string_options.split()]
-        first_el = options[int(lower_range*len(options))]
-        last_el = options[int(upper_range * len(options)) - 1]
-        # print(f"X_first: {lower_range}, X_last: {upper_range}")
-        # print(f"First: {first_el}, Last: {last_el}")
-        return first_el, last_el
-
     def move_cursor_end(self):
-        # Scroll to the end of the Listbox
-        self.list_box.xview_moveto(1.0)
+        self.move_to(self.start + self.length - self.window)
 
     def destroy(self):
+        if self.redraw_id is not None:
+            self.after_cancel(self.redraw_id)
+            self.redraw_id = None
         super().destroy()
-        self.list_box.destroy()
 
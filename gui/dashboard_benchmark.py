@@ -0,0 +1,179 @@
+""" Headless end-to-end benchmark of the dashboard:
+parser -> App.extend_sensor_values -> sample queue -> update_graph -> render,
+with the detection in its worker thread when a model is given
+The App runs without the window (only the Tcl interpreter, Tk is not loaded)
+and the graph is rendered by the Agg backend, so no display is needed.
+The stages run one after another as fast as possible; the report is printed as JSON.
+
+Usage:
+    python dashboard_benchmark.py --rate 100 --sensors 4 --history 100000 --duration 60 --output result.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import tkinter as tk
+import numpy as np
+import psutil
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import ui_config
+from app_ui import App
+from perf_metrics import LatencyRecorder
+from data_parser import parse_lines, replace_outliers, DEFAULT_VALUE
+
+
+class HeadlessApp(App):
+    """ App without the window, only the data path and the graph """
+    def __init__(self, sensor_names: list[str]):
+        tk.Tk.__init__(self, useTk=False)
+        self.init_state(sensor_names=sensor_names)
+        fig, _ = self.create_figure()
+        self.graph_canvas = FigureCanvasAgg(fig)
+        self.graph_blitter = self.create_graph_blitter(self.graph_canvas)
+        self.is_stopped = True  # frames are driven by the benchmark, not by after()
+
+
+def get_sensor_names(sensors_num: int) -> list[str]:
+    """ The configured sensors first, so the detection still finds them """
+    names: list[str] = list(ui_config.ElementNames.sensor_names.value)
+    names += [f"Sensor {i}" for i in range(len(names) + 1, sensors_num + 1)]
+    return names[:sensors_num]
+
+
+def create_lines(samples_num: int, rng: np.random.Generator) -> bytes:
+    """ Raw bytes of the device messages, 1% of them are outliers """
+    values = rng.integers(300, 900, size=(samples_num, 2))
+    values[rng.random(samples_num) < 0.01, 0] = 1400
+    return b"".join(b"Range, %d, %d, mm\r\n" % (a, b) for a, b in values)
+
+
+def fit_to_sensors(values: np.ndarray, sensors_num: int) -> np.ndarray:
+    """ The protocol carries two sensors, the columns are repeated for more sensors """
+    repeats = -(-sensors_num // values.shape[1])
+    return np.tile(values, (1, repeats))[:, :sensors_num]
+
+
+def get_rss() -> float:
+    return psutil.Process().memory_info().rss / 1024 ** 2
+
+
+def run(rate: float, sensors_num: int, history: int, duration: float, model_path=None, seed=0) -> dict:
+    rng = np.random.default_rng(seed)
+    rss_start = get_rss()
+    app = HeadlessApp(get_sensor_names(sensors_num))
+    if model_path:
+        from posture_model import load_predict, warm_up
+        predict = load_predict(model_path, cache_path=ui_config.FilePaths.model_cache_path.value)
+        warm_up(predict)
+        app.set_model(predict)
+        app.current_user_features = np.array([30, 2, 70, 1.75, 170], dtype=float)
+    # Session history before the measurement
+    prefill = rng.integers(300, 900, size=(history, sensors_num))
+    app.sensor_buffer.extend(prefill, time.time_ns())
+    app.lod_pyramid.extend(prefill)
+    rss_prefilled = get_rss()
+
+    latency = LatencyRecorder()
+    interval: int = ui_config.Measurements.frame_interval.value
+    frames_num = int(duration * 1000 / interval)
+    samples_per_frame = rate * interval / 1000
+    pending = 0.0
+    last_values = [DEFAULT_VALUE, DEFAULT_VALUE]
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(frames_num):
+            pending += samples_per_frame
+            lines = create_lines(int(pending), rng)
+            pending -= int(pending)
+            if lines:
+                with latency.measure("parse"):
+                    values, _ = parse_lines(lines)
+                    values = replace_outliers(values, last_values)
+                    last_values = values[-1]
+                with latency.measure("publish"):
+                    app.extend_sensor_values(fit_to_sensors(values, sensors_num))
+            frame_start = app.frame_timer.start()
+            with latency.measure("drain"):
+                app.drain_sample_queue()
+            with latency.measure("alarms"):
+                app.detect_anomaly()
+            with latency.measure("update_graph"):
+                app.update_graph()
+            with latency.measure("render"):
+                full_redraw = app.graph_blitter.update()
+            app.frame_timer.stop(frame_start, full_redraw=full_redraw)
+            latency.add("frame", time.perf_counter() - frame_start)
+    elapsed = time.perf_counter() - start
+    # history view of the whole session, as after the pause
+    app.is_paused = True
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(10):
+            with latency.measure("history_view"):
+                app.update_graph(lower_range=0, upper_range=app.sensor_buffer.total)
+                app.graph_blitter.update()
+    detection = None
+    worker = app.detection_worker
+    if worker is not None:
+        worker.samples.join()  # the samples still waiting for the detection
+        app.detect_anomaly()
+        detection = {"scored": worker.scored_num,
+                     "dropped": worker.dropped_num,
+                     "failed": worker.failed_num,
+                     "alarms": app.db_manager.session.alarm_log.get_summary(),
+                     "lag_s": round(time.perf_counter() - start - elapsed, 4),
+                     "batches": worker.latency.get_summary().get("score")}
+        worker.stop()
+    rss_end = get_rss()
+
+    frame_times = latency.durations["frame"]
+    return {"config": {"rate": rate,
+                       "sensors": sensors_num,
+                       "history": history,
+                       "duration_s": duration,
+                       "frame_interval_ms": interval,
+                       "buffer_capacity": app.sensor_buffer.capacity,
+                       "model": model_path},
+            "environment": {"python": platform.python_version(),
+                            "platform": platform.platform()},
+            "stages": latency.get_summary(),
+            "frames": frames_num,
+            "samples": int(app.sensor_buffer.total - history),
+            "full_redraws": app.frame_timer.full_redraws_num,
+            "first_frame_s": round(app.frame_timer.first_frame_uptime, 3),  # since the start of the process
+            "fps": {"achieved": round(frames_num / elapsed, 2),
+                    "max": round(len(frame_times) / sum(frame_times), 2)},
+            "realtime_factor": round(duration / elapsed, 2),
+            "queue": {"max_depth": app.sample_queue.max_depth,
+                      "dropped": app.sample_queue.dropped_num},
+            "detection": detection,
+            "memory_mb": {"start": round(rss_start, 2),
+                          "after_history": round(rss_prefilled, 2),
+                          "end": round(rss_end, 2),
+                          "growth": round(rss_end - rss_prefilled, 2)}}
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description="Headless benchmark of the ingestion and rendering")
+    parser.add_argument("--rate", type=float, default=100, help="samples/s")
+    parser.add_argument("--sensors", type=int, default=2)
+    parser.add_argument("--history", type=int, default=0, help="samples in the buffer before the start")
+    parser.add_argument("--duration", type=float, default=30, help="s of the simulated session")
+    parser.add_argument("--model", default=None, help="path to the .h5 model to run the detection "
+                                                      "(cached in data/model_cache after the first run)")
+    parser.add_argument("--output", default=None, help="file to save the JSON report")
+    options = parser.parse_args(args)
+    report = run(rate=options.rate, sensors_num=options.sensors, history=options.history,
+                 duration=options.duration, model_path=options.model)
+    content = json.dumps(report, indent=2)
+    print(content)
+    if options.output:
+        with open(options.output, "w") as file:
+            file.write(content)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
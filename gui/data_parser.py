@@ -0,0 +1,56 @@
+""" Parser of the messages sent by the device:
+Range, <sensor 2 (mm)>, <sensor 4 (mm)>, mm
+A batch of lines is parsed in one pass of the compiled pattern over the joined bytes
+"""
+
+import re
+from itertools import chain
+from typing import Union
+import numpy as np
+
+LINE_PATTERN = re.compile(rb"^Range, (\d+), (\d+), mm", re.MULTILINE)  # not anchored at the end, as the baseline re.match
+SENSORS_NUM = 2
+OUTLIER_LIMIT = 1200  # mm, values from the limit are replaced with the previous value
+DEFAULT_VALUE = 600  # mm, used if there is no previous value
+
+
+def parse_lines(lines: Union[list[bytes], list[str], bytes]) -> tuple[np.ndarray, int]:
+    """ Parse the batch of received lines
+    :param lines is a list of lines (bytes or str) or the raw bytes separated by newlines
+    :returns values as np.array of the shape (n, 2) and the number of rejected lines
+    """
+    if isinstance(lines, (bytes, bytearray)):
+        data = bytes(lines)
+        lines_num = data.count(b"\n") + (0 if data.endswith(b"\n") or not data else 1)
+    else:
+        lines_num = len(lines)
+        if lines and isinstance(lines[0], str):
+            lines = [line.encode("utf-8") for line in lines]
+        data = b"\n".join(lines)
+    matches = LINE_PATTERN.findall(data)
+    if not matches:
+        return np.empty((0, SENSORS_NUM), dtype=np.int64), lines_num
+    try:
+        values = np.fromiter(map(int, chain.from_iterable(matches)), dtype=np.int64,
+                             count=SENSORS_NUM * len(matches))
+    except OverflowError:
+        # a corrupted value too long for int64 is an outlier, as any value from OUTLIER_LIMIT
+        values = np.fromiter((min(int(value), OUTLIER_LIMIT) for value in chain.from_iterable(matches)),
+                             dtype=np.int64, count=SENSORS_NUM * len(matches))
+    return values.reshape(-1, SENSORS_NUM), lines_num - len(matches)
+
+
+def replace_outliers(values: np.ndarray, previous: Union[list, np.ndarray]) -> np.ndarray:
+    """ Replace the values from OUTLIER_LIMIT with the last valid value of the same sensor
+    :param values is np.array of the shape (n, number of sensors)
+    :param previous is the last value of every sensor before the batch
+    """
+    if not (values >= OUTLIER_LIMIT).any():
+        return values
+    padded = np.vstack([np.asarray(previous, dtype=values.dtype).reshape(1, -1), values])
+    is_valid = padded < OUTLIER_LIMIT
+    is_valid[0] = True
+    # index of the last valid row for every position of every sensor
+    rows = np.where(is_valid, np.arange(len(padded)).reshape(-1, 1), 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(padded, rows, axis=0)[1:]
@@ -1,12 +1,13 @@
-import pandas as pd
 import ui_config
-import csv
 import datetime
-import bcrypt
 from typing import Union
 from tkinter import filedialog
 from pathlib import Path
 import re
+import numpy as np
+from user_store import UserStore
+from perf_metrics import LatencyRecorder
+from alarm_log import AlarmLog
 
 
 class UserDetails:
@@ -81,13 +82,15 @@ class UserDetails:
         return ordered_data
 
     def is_valid_password(self, stored_password: str) -> bool:
+        import bcrypt  # imported at the first sign-in, not at the start of the app
         stored_password: bytes = stored_password.encode('utf-8')
         this_pw: bytes = self.password.encode('utf-8')
         return bcrypt.checkpw(password=this_pw, hashed_password=stored_password)
 
     @staticmethod
     def encrypt_password(new_password: str) -> str:
-        salt = bcrypt.gensalt()
+        import bcrypt
+        salt = bcrypt.gensalt(rounds=ui_config.Measurements.bcrypt_rounds.value)
         return bcrypt.hashpw(new_password.encode('utf-8'), salt).decode('utf-8')
 
     @staticmethod
@@ -99,33 +102,36 @@ class UserDetails:
 
 class SessionInstance:
     user_id: int
-    alarm_times: list[str]
+    alarm_log: AlarmLog
     user_details: UserDetails
     session_start_time: datetime.datetime
+    start_index: int
     graph_file_path: str
 
     def __init__(self):
         self.user_id = -1
         self.user_details = self.get_default_details()
-        self.alarm_times = []
-        self.session_start_time = datetime.datetime.now()
+        self.start(start_index=0)
         self.graph_file_path = self.get_graph_img_path()
 
-    def update(self, user_id: int, details: UserDetails):
+    def start(self, start_index: int):
+        """ Begin a new session with the sample number start_index of the sensor buffer,
+        the alarms and the samples before it belong to the previous user
+        """
+        self.alarm_log = AlarmLog(max_gap=ui_config.Measurements.alarm_episode_gap.value)
+        self.session_start_time = datetime.datetime.now()
+        self.start_index = start_index
+
+    def update(self, user_id: int, details: UserDetails, start_index=0):
         """ Remember user details when signed in """
         self.user_id = user_id
         self.user_details = details
+        self.start(start_index)
         self.graph_file_path = self.get_graph_img_path()
 
     def get_total_alarm_time(self) -> float:
-        if len(self.alarm_times) == 0:
-            return 0.0
-        # Calculate the time difference in minutes
-        time_format: str = ui_config.Measurements.time_format.value
-        first_time = datetime.datetime.strptime(self.alarm_times[0], time_format)
-        last_time = datetime.datetime.strptime(self.alarm_times[-1], time_format)
-        time_diff = (last_time - first_time).total_seconds() / 60
-        return time_diff
+        """ Minutes of all alarm episodes """
+        return self.alarm_log.get_total_time() / 60
 
     def get_session_elapsed_time(self) -> str:
         this_time = datetime.datetime.now()
@@ -145,10 +151,12 @@ class SessionInstance:
         path = "/gui/data/img/graphs" + file_name
         return path
 
-    def reset(self):
+    def reset(self, start_index=0):
         """ Reset is used when the user signs out """
         self.user_id = -1
         self.user_details = self.get_default_details()
+        self.start(start_index)
+        self.graph_file_path = self.get_graph_img_path()
 
     @staticmethod
     def get_default_details() -> UserDetails:
@@ -168,7 +176,9 @@ class ReportWriter:
         content = f"""## User Details:\n
         | Name | {self.session.user_details.get_full_name()} |
         | --- | --- |
-        | Alarm Total Time | {self.session.get_total_alarm_time()} |
+        | Alarm Total Time | {self.session.get_total_alarm_time():.2f} min |
+        | Alarm Episodes | {self.session.alarm_log.episodes_num} |
+        | Longest Episode | {self.session.alarm_log.get_longest_episode():.1f} s |
         | Elapsed Time | {self.session.get_session_elapsed_time()} |
         | Age | {self.session.user_details.age} |
         | Gender | {self.session.user_details.gender} |
@@ -188,13 +198,18 @@ class ReportWriter:
         """
         return content
 
-    def save_report(self, path=None):
+    def render(self) -> str:
+        content = self.get_header() + self.get_stats()
+        return re.sub(r'\n\s+', '\n', content)
+
+    def save_report(self, path=None, content=None):
         """ The function collect all the data from the app
         and save in the format of .md or .txt
         If the param path is None, the user may have an opportunity to select the destination
+        content rendered beforehand is written as it is, the session may change in the meantime
         """
-        content = self.get_header() + self.get_stats()
-        content = re.sub(r'\n\s+', '\n', content)
+        if content is None:
+            content = self.render()
         with open(self.get_path(path), "w", encoding="utf-8") as file:
             file.write(content)
 
@@ -210,7 +225,7 @@ class ReportWriter:
 class DatabaseManager:
     """
     Storage and reading the data in csv format
-    using pandas
+    using pandas, the users are kept in the SQLite database of UserStore
     """
     users_login_path: str
     values_folder: str
@@ -223,92 +238,118 @@ class DatabaseManager:
         """ Store other object instances """
         self.session = SessionInstance()
         self.report_writer = ReportWriter(session=self.session)
-
-    def get_user_db(self) -> pd.DataFrame:
-        """ The method checks for the existence of the file
-        and creates an empty file with proper column names
-        if no file exists
+        self._user_store = None
+        self.password_latency = LatencyRecorder()  # bcrypt checks and hashes, to tune bcrypt_rounds
+
+    @property
+    def user_store(self) -> UserStore:
+        """ Opened at the first use, the users of logins.csv are moved to it once """
+        if self._user_store is None:
+            self._user_store = UserStore(ui_config.FilePaths.user_db_path.value, csv_path=self.users_login_path)
+        return self._user_store
+
+    def find_user_in_db(self, details: UserDetails) -> Union[dict, None]:
+        return self.user_store.find(details.first_name, details.last_name, details.middle_name)
+
+    def check_sign_in(self, details: UserDetails) -> Union[int, None]:
+        """ The function determines whether entered details are correct and completes them from the database
+        bcrypt takes hundreds of ms, so it is called from a worker thread, see App.run_in_background;
+        the session is updated with the returned user id in the thread of the window
+        :returns id of the user or None if the details are not correct
         """
-        try:
-            return pd.read_csv(self.users_login_path)
-        except:
-            users_login_db_headers: list[str] = ui_config.ElementNames.user_login_db_headers.value
-            with open(self.users_login_path, 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(users_login_db_headers)
-            print("Empty user login csv file has been created")
-            return pd.read_csv(self.users_login_path)
-
-    def find_user_in_db(self, details: UserDetails) -> pd.DataFrame:
-        df = self.get_user_db()
-        df = df.fillna("")
-        if df.shape[0] == 0:
-            return df  # return an empty df
-        df_condition = (df["First Name"] == details.first_name) \
-                        & (df["Second Name"] == details.last_name) \
-                        & (df["Middle Name"] == details.middle_name)
-        df = df[df_condition]
-        print(df)
-        return df  # return sorted df
-
-    def is_valid_sign_in(self, details: UserDetails) -> bool:
-        """ The function determines whether entered details are correct and add them into one session instance """
-        df_user = self.find_user_in_db(details)
-        if df_user.shape[0] == 0 or not details.is_valid_password(df_user["Password"].iloc[0]):
-            return False
+        user = self.find_user_in_db(details)
+        if user is None:
+            return None
+        with self.password_latency.measure("verify_password"):
+            is_valid = details.is_valid_password(user["Password"])
+        self.print_password_latency("verify_password")
+        if not is_valid:
+            return None
         # Get other details
-        details.photo_path = df_user["Photo Path"].iloc[0]
-        details.gender     = df_user["Gender"].iloc[0]
-        details.age        = df_user["Age"].iloc[0]
-        details.shoulder_size = df_user["Shoulder Size"].iloc[0]
-        details.height     = df_user["Height"].iloc[0]
-        details.weight     = df_user["Weight"].iloc[0]
+        details.photo_path = user["Photo Path"]
+        details.gender     = user["Gender"]
+        details.age        = user["Age"]
+        details.shoulder_size = user["Shoulder Size"]
+        details.height     = user["Height"]
+        details.weight     = user["Weight"]
         print("==== User below has signed in ====")
         print(details)
-        self.session.update(df_user.index,
-                            details)
-        return True
+        return user["id"]
 
     def save_user(self, details: UserDetails) -> bool:
         """ The function returns bool to determine completion of the process
         True if the data has been successfully added
         False if the data is already stored in the db
         """
-        data_entity = details.get_ordered_data()
-        if self.find_user_in_db(details).shape[0] > 0:
+        if self.find_user_in_db(details) is not None:
             return False  # details already exists
+        with self.password_latency.measure("hash_password"):
+            data = details.get_ordered_data()
+        self.print_password_latency("hash_password")
+        return self.user_store.add(data)
 
-        with open(self.users_login_path, "a", newline="") as file:
-            csv_writer = csv.writer(file)
-            csv_writer.writerow(data_entity)
-        return True  # details have been saved
+    def print_password_latency(self, stage: str) -> None:
+        duration = self.password_latency.durations[stage][-1]
+        print(f"{stage}: {1000 * duration:.0f} ms (bcrypt rounds for new hashes: "
+              f"{ui_config.Measurements.bcrypt_rounds.value})")
 
-    def save_data(self, data: dict, time: list[str]):
+    def save_data(self, data: dict, time: list[str], user_id: int, report: str):
         """
         The function receive the sensor data collected by app
         and transform to csv file named according to the user id
+        user_id and the report are taken from the session when the data is saved, see App.save_data
         """
         # Ensure the user ID is a string and print it for debugging
-        user_id = str(self.session.user_id)
+        user_id = str(user_id)
         print(f"User ID: {user_id}")
 
         # Correctly format the path with the user ID
         path: str = f'{self.values_folder}/{user_id}.csv'
         print(f"Path: {path}")
 
+        import pandas as pd
         df = pd.DataFrame.from_dict(data)
         time_ds = pd.Series(data=time)
         df["Time"] = time_ds
         """ Save data """
         df.to_csv(path, index=False)
-        path = self.get_default_report_path(extension='.md')
-        self.report_writer.save_report(path)  # set path=None, to allow the user for selection of the destination
-        print("Total alarm time: ", self.session.get_total_alarm_time(), " minutes")
+        path = self.get_default_report_path(extension='.md', user_id=user_id)
+        self.report_writer.save_report(path, report)  # set path=None, to allow the user for selection of the destination
         print(f"Data has been saved to {path}")
-        print(f"Report has been saved to {self.report_writer.path.name}")
+        print(f"Report has been saved to {Path(path).name}")
 
-    def get_default_report_path(self, extension: str) -> str:
-        return ui_config.FilePaths.reports_folder_path.value + '/report_' + str(self.session.user_id) + extension
+    @staticmethod
+    def export_range(path: str, source, lower: int, upper: int, notes="") -> int:
+        """ Write the samples [lower, upper) of the source (SensorBuffer or SessionFile) to the CSV
+        in chunks, so the whole range is never held in memory as a DataFrame
+        :returns number of samples written
+        """
+        import pandas as pd
+        from sensor_buffer import format_times
+        samples_num = 0
+        with open(path, 'w', newline='') as file:
+            # the header also for an empty range
+            pd.DataFrame(columns=['Time', *source.sensor_names, 'Notes']).to_csv(file, index=False)
+            for values, times in source.iter_chunks(lower, upper):
+                if np.all(values % 1 == 0):
+                    values = values.astype(np.int64)  # the distances are whole mm, ints are written faster
+                df = pd.DataFrame({'Time': format_times(times, ui_config.Measurements.time_format.value),
+                                   **source.to_dict(values)})
+                df["Notes"] = notes
+                # whole values are written as ints in every chunk, e.g. 123 and not 123.0
+                df.to_csv(file, index=False, header=False, float_format="%.15g")
+                samples_num += len(df)
+        return samples_num
+
+    def get_session_file_path(self) -> str:
+        """ Columnar copy of the saved data, see session_file.py; one file per session for batch_report.py """
+        start = self.session.session_start_time.strftime("%Y%m%d_%H%M%S")
+        return f'{self.values_folder}/{self.session.user_id}_{start}.session'
+
+    def get_default_report_path(self, extension: str, user_id=None) -> str:
+        if user_id is None:
+            user_id = self.session.user_id
+        return ui_config.FilePaths.reports_folder_path.value + '/report_' + str(user_id) + extension
 
     def get_user_photo_path(self, relative_path=False) -> str:
         if not relative_path:
@@ -323,7 +364,4 @@ class DatabaseManager:
 
     def save_new_photo_path(self, new_path: str):
         user_id: int = self.session.user_id
-        df: pd.DataFrame = self.get_user_db()
-        df['Photo Path'] = df['Photo Path'].astype(str)
-        df.loc[user_id, 'Photo Path'] = new_path
-        df.to_csv(self.users_login_path, index=False)
+        self.user_store.update_photo_path(user_id, new_path)
@@ -0,0 +1,96 @@
+from contextlib import contextmanager
+from matplotlib.artist import Artist
+
+
+class GraphBlitter:
+    """ Incremental redraw of the graph with two cached layers
+    1. background: the figure without the animated artists (title, legend, spines),
+       rendered only on the first frame, on resize or after request_full_redraw()
+    2. axes background: the background with the axes artists (ticks, labels, alarm spans),
+       rendered again only after request_axes_redraw(), e.g. when the limits change
+    Every frame restores the axes background and draws only the line artists
+    """
+    def __init__(self, canvas, animated_artists: list[Artist], axes_artists=()):
+        self.canvas = canvas
+        self.artists = list()
+        self.axes_artists = list()
+        for artist in animated_artists:
+            self.add_artist(artist)
+        for artist in axes_artists:
+            self.add_axes_artist(artist)
+        self.background = None
+        self.axes_background = None
+        self.needs_full_redraw = True
+        # a full draw made by anyone (resize, span selector) refreshes the cached background
+        self.draw_event_id = canvas.mpl_connect("draw_event", self.on_draw)
+
+    def add_artist(self, artist: Artist) -> None:
+        """ Artist drawn on every frame """
+        artist.set_animated(True)
+        self.artists.append(artist)
+
+    def add_axes_artist(self, artist: Artist) -> None:
+        """ Artist which depends only on the limits of the axes """
+        artist.set_animated(True)
+        self.axes_artists.append(artist)
+        self.request_axes_redraw()
+
+    def remove_axes_artist(self, artist: Artist) -> None:
+        if artist in self.axes_artists:
+            self.axes_artists.remove(artist)
+            self.request_axes_redraw()
+
+    def request_full_redraw(self) -> None:
+        self.needs_full_redraw = True
+
+    def request_axes_redraw(self) -> None:
+        self.axes_background = None
+
+    def on_draw(self, event=None) -> None:
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_axes_artists()
+        self.draw_artists()
+
+    def draw_artists(self) -> None:
+        figure = self.canvas.figure
+        for artist in self.artists:
+            figure.draw_artist(artist)
+
+    def draw_axes_artists(self) -> None:
+        figure = self.canvas.figure
+        for artist in self.axes_artists:
+            figure.draw_artist(artist)
+        self.axes_background = self.canvas.copy_from_bbox(figure.bbox)
+
+    def update(self) -> bool:
+        """ Render one frame
+        :returns True if the whole figure has been rendered
+        """
+        if self.needs_full_redraw or self.background is None:
+            self.needs_full_redraw = False
+            self.canvas.draw()  # calls on_draw
+            return True
+        if self.axes_background is None:
+            self.canvas.restore_region(self.background)
+            self.draw_axes_artists()
+        else:
+            self.canvas.restore_region(self.axes_background)
+        self.draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        return False
+
+    @contextmanager
+    def static_artists(self):
+        """ Temporarily draw the animated artists as the usual ones, e.g. to save the figure """
+        artists = self.axes_artists + self.artists
+        for artist in artists:
+            artist.set_animated(False)
+        try:
+            yield
+        finally:
+            for artist in artists:
+                artist.set_animated(True)
+            self.request_full_redraw()
+
+    def disconnect(self) -> None:
+        self.canvas.mpl_disconnect(self.draw_event_id)
@@ -0,0 +1,121 @@
+""" Level-of-detail summary of a whole session for the history view of the graph
+
+Level 0 keeps the min and max of every bucket of base_bucket samples,
+every next level combines factor buckets of the previous one.
+A range of any length is drawn from the level with at most max_points points,
+so the cost of a redraw does not depend on the length of the session;
+short ranges are drawn from the raw samples.
+"""
+
+from typing import Callable
+import numpy as np
+
+
+class MinMaxPyramid:
+    """ Updated with every received batch, see extend() """
+    def __init__(self, sensors_num: int, base_bucket=16, factor=4):
+        self.sensors_num = sensors_num
+        self.base_bucket = base_bucket
+        self.factor = factor
+        self.total = 0  # number of samples summarised, including the pending ones
+        self.pending = np.empty((0, sensors_num))  # samples of the incomplete bucket of level 0
+        self.mins = list()  # per level: (capacity, sensors) array, the first counts[level] rows are used
+        self.maxs = list()
+        self.counts = list()  # number of complete buckets per level
+        self.combined = list()  # number of buckets per level already combined into the next level
+
+    def get_bucket_size(self, level: int) -> int:
+        return self.base_bucket * self.factor ** level
+
+    def extend(self, values: np.ndarray) -> None:
+        """ Add the samples of the shape (n, number of sensors) """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, self.sensors_num)
+        self.total += len(values)
+        if len(self.pending):
+            values = np.concatenate([self.pending, values])
+        full = len(values) // self.base_bucket * self.base_bucket
+        self.pending = values[full:].copy()
+        if not full:
+            return
+        buckets = values[:full].reshape(-1, self.base_bucket, self.sensors_num)
+        self.add_buckets(0, buckets.min(axis=1), buckets.max(axis=1))
+
+    def add_buckets(self, level: int, mins: np.ndarray, maxs: np.ndarray) -> None:
+        if level == len(self.counts):
+            self.mins.append(np.empty((max(64, len(mins)), self.sensors_num)))
+            self.maxs.append(np.empty((max(64, len(mins)), self.sensors_num)))
+            self.counts.append(0)
+            self.combined.append(0)
+        count = self.counts[level]
+        if count + len(mins) > len(self.mins[level]):
+            capacity = max(2 * len(self.mins[level]), count + len(mins))
+            for storage in (self.mins, self.maxs):
+                grown = np.empty((capacity, self.sensors_num))
+                grown[:count] = storage[level][:count]
+                storage[level] = grown
+        self.mins[level][count:count + len(mins)] = mins
+        self.maxs[level][count:count + len(maxs)] = maxs
+        self.counts[level] += len(mins)
+        # combine the complete groups of factor buckets into the next level
+        start = self.combined[level]
+        groups = (self.counts[level] - start) // self.factor
+        if not groups:
+            return
+        stop = start + groups * self.factor
+        self.combined[level] = stop
+        shape = (groups, self.factor, self.sensors_num)
+        self.add_buckets(level + 1,
+                         self.mins[level][start:stop].reshape(shape).min(axis=1),
+                         self.maxs[level][start:stop].reshape(shape).max(axis=1))
+
+    def choose_level(self, length: int, max_points: int) -> int:
+        """ Level with at most max_points points (two per bucket) in the range of the length,
+        -1 if the raw samples fit
+        """
+        if length <= max_points or not self.counts:
+            return -1
+        level = 0
+        while level + 1 < len(self.counts) and 2 * length / self.get_bucket_size(level) > max_points:
+            level += 1
+        return level
+
+    def get_view(self, sensor_index: int, lower: int, upper: int, max_points: int,
+                 read_raw: Callable[[int, int], np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """ (x, y) to draw the samples [lower, upper) of the sensor with at most ~max_points points
+        Every bucket is drawn as its min and max at its centre.
+        read_raw(lower, upper) returns the raw samples, it is used for short ranges
+        and for the newest samples which do not fill a bucket yet
+        """
+        upper = min(upper, self.total)
+        level = self.choose_level(upper - lower, max_points)
+        if level < 0:
+            y = read_raw(lower, upper)
+            return np.arange(lower, lower + len(y)), y
+        size = self.get_bucket_size(level)
+        first = lower // size
+        last = min(-(-upper // size), self.counts[level])
+        mins = self.mins[level][first:last, sensor_index]
+        maxs = self.maxs[level][first:last, sensor_index]
+        centers = (np.arange(first, last) + 0.5) * size
+        tail_start = max(last * size, lower)
+        if tail_start < upper:
+            tail = read_raw(tail_start, upper)
+            if len(tail):
+                mins = np.append(mins, tail.min())
+                maxs = np.append(maxs, tail.max())
+                centers = np.append(centers, (tail_start + upper) / 2)
+        x = np.repeat(centers, 2)
+        y = np.empty(len(x))
+        y[0::2] = mins
+        y[1::2] = maxs
+        return x, y
+
+    @classmethod
+    def from_source(cls, source, chunk=1_000_000, **kwargs) -> 'MinMaxPyramid':
+        """ Pyramid of the whole SessionFile, read in chunks """
+        pyramid = cls(len(source.sensor_names), **kwargs)
+        lower, upper = source.clip_range(None, None)
+        for start in range(lower, upper, chunk):
+            values, _ = source.get_window(start, min(start + chunk, upper))
+            pyramid.extend(values)
+        return pyramid
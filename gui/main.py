@@ -1,13 +1,18 @@
-import threading
+import sys
+from perf_metrics import StartupProfile
+# the imports below are timed with --profile-startup
+startup_profile = StartupProfile(enabled="--profile-startup" in sys.argv)
+startup_profile.track_imports()
+import argparse
 from app_ui import App
 import time
 import ui_config as uc
-import random
-import serial
-import re
-from posture_data_collection import PostureDataCollection
-import wx
-from serial_manager import SerialManager
+from typing import Union
+from acquisition_manager import AcquisitionManager, get_port_name
+from async_acquisition import AcquisitionEngine
+from serial_replay import SerialRecorder
+startup_profile.mark("imports")
+
 class ThreadManager:
     """ The prototype consists of 2 TOF sensors and 1 image sensor,
     based on their data, we create the graph in one subplot to show
@@ -16,11 +21,16 @@ class ThreadManager:
     app: App
     alarm_num: int
     time_delay: float
-    reading_thread: threading.Thread
+    acquisition: Union[AcquisitionManager, AcquisitionEngine]
 
-    def __init__(self, app_title: str):
+    def __init__(self, app_title: str, port=uc.Measurements.serial_port.value, record_path=None, ports=None,
+                 engine="threads"):
         self.app = App(title=app_title)
-        self.reading_thread = threading.Thread(target=self.connect, daemon=True)
+        # the first port is shown on the graph, the others are written to their session logs
+        self.ports = ports or [port]
+        self.record_path = record_path  # file to record the raw stream of the shown device
+        # one thread with a selector, or the asyncio pipelines of async_acquisition.py
+        self.acquisition = AcquisitionEngine() if engine == "asyncio" else AcquisitionManager()
         self.time_delay = uc.Measurements.thread_delay.value
         self.alarm_num = 0
         self.ser = None
@@ -30,69 +40,42 @@ class ThreadManager:
         self.app.run_app()
 
     def start_thread(self):
-        self.reading_thread.start()
+        self.connect()
+        self.acquisition.start()
 
     def stop_thread(self):
         self.app.is_stopped = True
-        if self.reading_thread.is_alive():
-            self.reading_thread.join()
+        self.acquisition.stop()
 
     def interrupt(self):
         self.app.is_stopped = True
+        self.acquisition.stop()
 
     def close_app(self):
         self.interrupt()
         time.sleep(0.1)
+        print(f"Sample rate: {self.app.get_rate_stats()}")
+        print(f"Devices: {self.acquisition.get_stats()}")
+        print(f"Password checks: {self.app.db_manager.password_latency.get_summary()}")
         self.app.destroy()
 
     def connect(self, data=None) -> None:
-        """ Connect to the COM port """
+        """ Connect to the COM ports, all of them are read by one thread
+        The samples of the shown device are dropped while the window is paused, as before,
+        the other devices are not shown, so their session logs are written without a break
+        """
         # Add communication with COM port (DONE)
-        try:
-            ser = serial.Serial('COM8', 115200, timeout=1)
-        except serial.SerialException as e:
-            print(f"Error opening serial port: {e}")
-            return
-        while not self.app.is_stopped:
-            if not self.app.is_paused:
-                if ser.in_waiting > 0:
-                    line = ser.readline().decode('utf-8').rstrip()
-                    self.parse_data(line)
-            time.sleep(self.time_delay)
-        else:
-            print("Data Parsing has been stopped")
-            ser.close()
-
-    def parse_data(self, data) -> None:
-        """ Parse the sensor data """
-        print(f"=== Data Received: {data} ===")
-        match = re.match(r"Range, (\d+), (\d+), mm", data)
-        if match:
-            value1, value2 = map(int, match.groups())
-            print(f"Parsed values: {value1}, {value2}")
-
-            new_vals = self.app.sensor_values
-            if "Sensor 2" not in new_vals:
-                new_vals["Sensor 2"] = []
-            if "Sensor 4" not in new_vals:
-                new_vals["Sensor 4"] = []
-
-            # Check for anomalies and replace with the previous value if over 1200
-            if value1 >= 1200:
-                if new_vals["Sensor 2"]:
-                    value1 = new_vals["Sensor 2"][-1]
-                else:
-                    value1 = 600
-            if value2 >= 1200:
-                if new_vals["Sensor 4"]:
-                    value2 = new_vals["Sensor 4"][-1]
-                else:
-                    value2 = 600
-
-            new_vals["Sensor 2"].append(value1)
-            new_vals["Sensor 4"].append(value2)
-
-            self.app.update_sensor_values(new_vals)
+        sensor_names: list[str] = uc.ElementNames.sensor_names.value
+        for i, port in enumerate(self.ports):
+            if i == 0:
+                recorder = SerialRecorder(self.record_path) if self.record_path else None
+                # the session log is written by the reading thread, before the sample queue may drop samples
+                self.acquisition.add_device(port, len(sensor_names), queue=self.app.sample_queue,
+                                            log=self.app.session_log, recorder=recorder,
+                                            is_paused=lambda: self.app.is_paused)
+            else:
+                log = self.app.create_session_log(sensor_names, suffix="_" + get_port_name(port))
+                self.acquisition.add_device(port, len(sensor_names), log=log)
 
     def send_command(self, command: str) -> None:
         """ Send a command to the device """
@@ -104,38 +87,58 @@ class ThreadManager:
         else:
             print("Serial port did not get this command. Please debug.")
 
-def main_test():
-    app = wx.App(False)
-    test_proc = ThreadManager(app_title="Testing Data Validation")
-    sample_data = {"Sensor 2": [], "Sensor 4": []}
-    test_proc.app.sensor_values = sample_data
+def main_test(ports: list[str], record_path=None, engine="threads"):
+    test_proc = ThreadManager(app_title="Testing Data Validation", ports=ports, record_path=record_path,
+                              engine=engine)
+    startup_profile.mark("window created")
     """ Add buttons """
     pause_graph_txt: str = uc.ElementNames.pause_button_txt.value
     close_app_txt: str = uc.ElementNames.close_button_txt.value
     save_txt: str = uc.ElementNames.save_data_button_txt.value
+    open_session_txt: str = uc.ElementNames.open_session_button_txt.value
     sign_in_txt: str = uc.ElementNames.sign_in_button_txt.value
     register_txt: str = uc.ElementNames.register_button_txt.value
 
     num_alarms_label: str = uc.ElementNames.alarm_num_label.value
     proc_time_label: str = uc.ElementNames.processing_time_label.value
+    frame_rate_label: str = uc.ElementNames.frame_rate_label.value
+    devices_label: str = uc.ElementNames.devices_label.value
 
     app_ui = test_proc.app
 
     app_ui.add_control_button(text=pause_graph_txt, func=app_ui.pause)
     app_ui.add_control_button(text=close_app_txt, func=test_proc.close_app)
     app_ui.add_control_button(text=save_txt, func=app_ui.save_data)
+    app_ui.add_control_button(text=open_session_txt, func=app_ui.open_session)
     app_ui.add_menu_button(text=sign_in_txt, func=app_ui.show_sign_in_popup)
     app_ui.add_menu_button(text=register_txt, func=app_ui.show_register_popup)
     """ Add info panels """
     test_proc.app.create_alarms_label(num_alarms_label, str(0))
     test_proc.app.create_clock_label(proc_time_label)
-
-    # Xijun is woking on:
+    test_proc.app.create_frame_rate_label(frame_rate_label)
+    test_proc.app.create_devices_label(devices_label, test_proc.acquisition.get_stats)
+    startup_profile.mark("controls added")
+    if startup_profile.enabled:
+        app_ui.startup_profile = startup_profile
+
+    # Xijun is woking on (wx is imported only for this window):
+    # import wx
+    # from posture_data_collection import PostureDataCollection
+    # app = wx.App(False)
     # frame = PostureDataCollection(None, title="Posture Data Collection")
     # frame.Show()
 
     test_proc.run()
-    app.MainLoop()
+    # app.MainLoop()
 
 if __name__ == '__main__':
-    main_test()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", nargs="+", default=[uc.Measurements.serial_port.value],
+                        help="serial ports of the devices or of serial_replay.py, the first one is shown")
+    parser.add_argument("--record", default=None, help="file to record the raw serial stream")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="reading of the devices, see acquisition_manager.py and async_acquisition.py")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time of the startup stages and imports at the first frame")
+    options = parser.parse_args()
+    main_test(ports=options.port, record_path=options.record, engine=options.engine)
@@ -2,12 +2,18 @@
 and used for remote testing of new UI features
 """
 
+import sys
+from perf_metrics import StartupProfile
+# the imports below are timed with --profile-startup
+startup_profile = StartupProfile(enabled="--profile-startup" in sys.argv)
+startup_profile.track_imports()
 import threading
 from app_ui import App
 import time
 import ui_config as uc
 import random
 import psutil
+startup_profile.mark("imports")
 
 
 class ThreadManager:
@@ -61,48 +67,52 @@ class ThreadManager:
     def parse_data(self, data) -> None:
         # print("=== Data Parsed ===")
         # remove everything lower
-        new_vals = self.app.sensor_values
-        # increase values by one
-        if new_vals:
-            for key, value in new_vals.items():
-                some_value: int = random.randint(-30, 30)
-                value.append(some_value)
-            self.app.update_sensor_values(new_vals)
+        new_vals = dict()
+        for key in self.app.sensor_buffer.sensor_names:
+            some_value: int = random.randint(-30, 30)
+            new_vals[key] = some_value
+        self.app.update_sensor_values(new_vals)
 
     def check_memory_usage(self):
         memory_info = self.process.memory_info()
         print(f"Memory usage: {memory_info.rss / (1024 ** 2):.2f} MB (resident set size)")
         print(f"Memory usage: {memory_info.vms / (1024 ** 2):.2f} MB (virtual memory size)")
+        print(f"Sample queue: {self.app.sample_queue}")
+        print(f"Sample rate: {self.app.get_rate_stats()}")
 
 
 def main_test():
     test_proc = ThreadManager(app_title="Testing Data Validation")
-    sample_data = {"Sensor 2": [],
-                   "Sensor 4": [],
-                   }
-    test_proc.app.sensor_values = sample_data
+    startup_profile.mark("window created")
     """ Add buttons """
     pause_graph_txt: str = uc.ElementNames.pause_button_txt.value
     close_app_txt: str = uc.ElementNames.close_button_txt.value
     save_txt: str = uc.ElementNames.save_data_button_txt.value
+    open_session_txt: str = uc.ElementNames.open_session_button_txt.value
     sign_in_txt: str = uc.ElementNames.sign_in_button_txt.value
     register_txt: str = uc.ElementNames.register_button_txt.value
     add_notes_txt: str = uc.ElementNames.save_selected_button_txt.value
 
     num_alarms_label: str = uc.ElementNames.alarm_num_label.value
     proc_time_label: str = uc.ElementNames.processing_time_label.value
+    frame_rate_label: str = uc.ElementNames.frame_rate_label.value
 
     app_ui = test_proc.app
 
     app_ui.add_control_button(text=pause_graph_txt, func=app_ui.pause)
     app_ui.add_control_button(text=close_app_txt, func=test_proc.close_app)
     app_ui.add_control_button(text=save_txt, func=app_ui.save_data)
+    app_ui.add_control_button(text=open_session_txt, func=app_ui.open_session)
     app_ui.add_control_button(text=add_notes_txt, func=app_ui.show_notes_entry)
     app_ui.add_menu_button(text=sign_in_txt, func=app_ui.show_sign_in_popup)
     app_ui.add_menu_button(text=register_txt, func=app_ui.show_register_popup)
     """ Add info panels """
     test_proc.app.create_alarms_label(num_alarms_label, str(0))
     test_proc.app.create_clock_label(proc_time_label)
+    test_proc.app.create_frame_rate_label(frame_rate_label)
+    startup_profile.mark("controls added")
+    if startup_profile.enabled:
+        app_ui.startup_profile = startup_profile
 
     test_proc.run()
 
@@ -0,0 +1,90 @@
+""" Micro-benchmark of the parser of the device messages
+Compares the per-line path used before (re.match per decoded line,
+outliers checked one by one) with the batch parser in data_parser.
+Run: python parser_benchmark.py [lines per batch] [number of batches]
+"""
+
+import re
+import sys
+import time
+import random
+import numpy as np
+from data_parser import parse_lines, replace_outliers, DEFAULT_VALUE
+
+
+def create_batch(lines_num: int) -> list[bytes]:
+    """ Lines as they come from the serial port, with 1% of outliers and 1% of broken lines """
+    lines = []
+    for _ in range(lines_num):
+        chance = random.random()
+        if chance < 0.01:
+            lines.append(b"Range, 1400, 530, mm")
+        elif chance < 0.02:
+            lines.append(b"Range, 51")
+        else:
+            lines.append(f"Range, {random.randint(300, 900)}, {random.randint(300, 900)}, mm".encode())
+    return lines
+
+
+# lines the batch parser has to handle as the per-line parser did
+EDGE_CASES = [b"Range, 3, 4, mm ",  # trailing space
+              b"Range, 5, 6, mm\r",
+              b"Range, 9223372036854775808, 5, mm",  # corrupted, too long for int64
+              b"Range, 1, 99999999999999999999999, mm",
+              b"Range, 7, 8, mmx",
+              b"xRange, 1, 2, mm",
+              b"Range, 1, mm"]
+
+
+def parse_line_by_line(lines: list[bytes], previous: list[int]) -> list[tuple[int, int]]:
+    """ The way the lines were parsed before, without printing """
+    values = []
+    last_1, last_2 = previous
+    for line in lines:
+        match = re.match(r"Range, (\d+), (\d+), mm", line.decode('utf-8').rstrip())
+        if match:
+            value1, value2 = map(int, match.groups())
+            if value1 >= 1200:
+                value1 = last_1
+            if value2 >= 1200:
+                value2 = last_2
+            values.append((value1, value2))
+            last_1, last_2 = value1, value2
+    return values
+
+
+def parse_batch(lines: list[bytes], previous: list[int]) -> np.ndarray:
+    values, _ = parse_lines(lines)
+    return replace_outliers(values, previous)
+
+
+def measure(func, batches: list[list[bytes]]) -> float:
+    """ :returns lines per second """
+    previous = [DEFAULT_VALUE, DEFAULT_VALUE]
+    start = time.perf_counter()
+    for batch in batches:
+        func(batch, previous)
+    elapsed = time.perf_counter() - start
+    return sum(len(batch) for batch in batches) / elapsed
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    batches_num = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    random.seed(0)
+    batches = [create_batch(batch_size) for _ in range(batches_num)]
+    # Both paths must give the same values
+    expected = np.array(parse_line_by_line(batches[0], [DEFAULT_VALUE, DEFAULT_VALUE]))
+    assert np.array_equal(parse_batch(batches[0], [DEFAULT_VALUE, DEFAULT_VALUE]), expected)
+    expected = np.array(parse_line_by_line(EDGE_CASES, [DEFAULT_VALUE, DEFAULT_VALUE]))
+    assert np.array_equal(parse_batch(EDGE_CASES, [DEFAULT_VALUE, DEFAULT_VALUE]), expected)
+
+    per_line = measure(parse_line_by_line, batches)
+    batched = measure(parse_batch, batches)
+    print(f"Lines per batch: {batch_size}, batches: {batches_num}")
+    print(f"Per-line parser: {per_line:,.0f} lines/s")
+    print(f"Batch parser:    {batched:,.0f} lines/s ({batched / per_line:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+""" Lightweight counters to confirm the performance of the app while it runs """
+
+import sys
+import time
+import builtins
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+
+def get_uptime() -> float:
+    """ Time since the start of the process (s), including the start of the interpreter """
+    import psutil
+    return time.time() - psutil.Process().create_time()
+
+
+def get_rate_stats(times) -> dict:
+    """ Sample rate and the jitter of the intervals between receipts from the timestamps (ns)
+    Samples received at once share one timestamp, so the intervals are taken between receipts
+    """
+    import numpy as np
+    times = np.asarray(times, dtype=np.int64)
+    if len(times) < 2 or times[-1] <= times[0]:
+        return {"rate": 0.0, "receipt_interval_ms": 0.0, "jitter_ms": 0.0}
+    intervals = np.diff(np.unique(times)) / 1e6
+    return {"rate": round(float((len(times) - 1) / ((times[-1] - times[0]) / 1e9)), 2),
+            "receipt_interval_ms": round(float(intervals.mean()), 3),
+            "jitter_ms": round(float(intervals.std()), 3)}
+
+
+class FrameTimer:
+    """ Rolling statistics over the last frames rendered by the graph """
+    def __init__(self, size=120):
+        self.frame_starts = deque(maxlen=size)
+        self.frame_times = deque(maxlen=size)  # s
+        self.frames_num = 0
+        self.full_redraws_num = 0
+        self.first_frame_uptime = None  # time to the first frame since the start of the process (s)
+
+    @staticmethod
+    def start() -> float:
+        return time.perf_counter()
+
+    def stop(self, start: float, full_redraw=False) -> None:
+        self.frame_starts.append(start)
+        self.frame_times.append(time.perf_counter() - start)
+        self.frames_num += 1
+        if self.first_frame_uptime is None:
+            self.first_frame_uptime = get_uptime()
+        if full_redraw:
+            self.full_redraws_num += 1
+
+    def get_fps(self) -> float:
+        """ Frames per second achieved over the remembered frames """
+        if len(self.frame_starts) < 2:
+            return 0.0
+        elapsed = self.frame_starts[-1] - self.frame_starts[0]
+        return (len(self.frame_starts) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def get_mean_frame_time(self) -> float:
+        """ Average time spent per frame (ms) """
+        if not self.frame_times:
+            return 0.0
+        return 1000 * sum(self.frame_times) / len(self.frame_times)
+
+    def get_max_fps(self) -> float:
+        """ Frame rate the graph could sustain if frames were requested without delay """
+        mean_time = self.get_mean_frame_time()
+        return 1000 / mean_time if mean_time > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return f"{self.get_fps():.1f} FPS " \
+               f"({self.get_mean_frame_time():.1f} ms/frame, " \
+               f"max {self.get_max_fps():.0f} FPS, " \
+               f"{self.full_redraws_num}/{self.frames_num} full redraws)"
+
+
+class LatencyRecorder:
+    """ Durations of the named stages for percentile reports """
+    def __init__(self):
+        self.durations = defaultdict(list)  # s
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[stage].append(time.perf_counter() - start)
+
+    def add(self, stage: str, duration: float) -> None:
+        self.durations[stage].append(duration)
+
+    def get_summary(self) -> dict:
+        """ {stage: {"count": n, "mean_ms": ..., "p50_ms": ..., "p95_ms": ..., "p99_ms": ..., "max_ms": ...}} """
+        import numpy as np  # not imported with the module, so the startup profile can time it
+        summary = dict()
+        for stage, durations in self.durations.items():
+            values = 1000 * np.array(durations)
+            summary[stage] = {"count": len(values),
+                              "mean_ms": round(float(values.mean()), 4),
+                              "p50_ms": round(float(np.percentile(values, 50)), 4),
+                              "p95_ms": round(float(np.percentile(values, 95)), 4),
+                              "p99_ms": round(float(np.percentile(values, 99)), 4),
+                              "max_ms": round(float(values.max()), 4)}
+        return summary
+
+
+class StartupProfile:
+    """ Time to every stage of the start of the app and the import time of every package
+    The import time of a package does not include the packages it imports, e.g. matplotlib without numpy
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = dict()  # stage: time since the start of the process (s)
+        self.import_times = defaultdict(float)  # top level package: s
+        self.original_import = None
+        self.thread_id = threading.get_ident()
+        self.import_stack = list()  # time of the nested imports of every import in progress
+        self.mark("interpreter started")
+
+    def track_imports(self) -> None:
+        if not self.enabled or self.original_import is not None:
+            return
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def stop_tracking_imports(self) -> None:
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or threading.get_ident() != self.thread_id:
+            return self.original_import(name, globals, locals, fromlist, level)
+        start = time.perf_counter()
+        self.import_stack.append(0.0)
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            duration = time.perf_counter() - start
+            nested = self.import_stack.pop()
+            self.import_times[name.partition(".")[0]] += duration - nested
+            if self.import_stack:
+                self.import_stack[-1] += duration
+
+    def mark(self, stage: str) -> None:
+        if self.enabled:
+            self.stages[stage] = get_uptime()
+
+    def report(self, top=10) -> str:
+        lines = ["Startup profile (s since the start of the process):"]
+        previous = 0.0
+        for stage, uptime in self.stages.items():
+            lines.append(f"  {stage:<24}{uptime:8.3f}  (+{uptime - previous:.3f})")
+            previous = uptime
+        if self.import_times:
+            lines.append(f"Import time of {len(self.import_times)} packages (s), the slowest:")
+            slowest = sorted(self.import_times.items(), key=lambda item: item[1], reverse=True)
+            for package, duration in slowest[:top]:
+                lines.append(f"  {package:<24}{duration:8.3f}")
+        return "\n".join(lines)
@@ -4,8 +4,8 @@ import time
 import csv
 from datetime import datetime
 import serial
-import re
 from serial_manager import SerialManager
+from data_parser import parse_lines
 import os
 
 class PostureDataCollection(tk.Tk):
@@ -44,20 +44,12 @@ class PostureDataCollection(tk.Tk):
         readings = []
         end_time = time.time() + 3
         while time.time() < end_time:
-            line = self.serial_manager.read_line()
-            if line:
-                reading = self.parse_data(line)
-                if reading is not None:
-                    readings.append(reading)
+            lines = self.serial_manager.read_lines()
+            if lines:
+                values, _ = parse_lines(lines)
+                readings.extend(values.tolist())
         return readings
 
-    def parse_data(self, data) -> float:
-        match = re.match(r"Range, (\d+), (\d+), mm", data)
-        if match:
-            value1, value2 = map(int, match.groups())
-            return value1, value2
-        return None
-
     def save_data(self, data):
         directory = os.path.join(os.path.dirname(__file__), 'data', 'users')
         os.makedirs(directory, exist_ok=True)  # Ensure the directory exists
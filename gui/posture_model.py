@@ -0,0 +1,234 @@
+""" Posture detection with the trained model
+The features of all samples waiting for the detection are built at once
+and scored in one call of the compiled model, in the thread of DetectionWorker.
+The model is loaded in the background by ModelLoader; after the first load the traced
+scoring function is kept as a SavedModel, which loads without rebuilding the Keras model
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from typing import Callable, Union
+import numpy as np
+from perf_metrics import LatencyRecorder
+
+SENSOR_ANGLE = np.radians(20)  # angle between the sensors
+FEATURES_NUM = 11
+
+
+def get_features(values_2: np.ndarray, values_4: np.ndarray, user_features: np.ndarray) -> np.ndarray:
+    """ One row per sample:
+    age, shoulder size, weight, height, length, degree, sensor 4-2 difference,
+    sensor 2, sensor 4, flexibility, ratio
+    """
+    flexibility = user_features[4]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        length = values_4 * np.cos(SENSOR_ANGLE) - values_2
+        degree = np.degrees(np.arctan(length / (values_4 * np.sin(SENSOR_ANGLE))))
+    dynamic_features = np.column_stack([length,
+                                        degree,
+                                        values_4 - values_2,
+                                        values_2,
+                                        values_4,
+                                        np.full(len(values_2), flexibility),
+                                        length / flexibility])
+    static_features = np.broadcast_to(user_features[:4], (len(values_2), 4))
+    return np.hstack([static_features, dynamic_features]).astype(np.float32)
+
+
+def compile_predict(model) -> Callable[[np.ndarray], np.ndarray]:
+    """ The model call traced once for any number of rows, without the overhead of model.predict """
+    import tensorflow as tf
+
+    @tf.function(input_signature=[tf.TensorSpec(shape=[None, FEATURES_NUM], dtype=tf.float32)])
+    def predict(features):
+        return model(features, training=False)
+
+    return lambda features: predict(features).numpy()
+
+
+def get_model_stamp(model_path: str) -> dict:
+    """ Identifies the version of the model file the cache was made from """
+    stat = os.stat(model_path)
+    return {"path": os.path.abspath(model_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def save_predict_cache(model, cache_path: str, stamp: dict) -> None:
+    import tensorflow as tf
+    module = tf.Module()
+    module.model = model  # the variables of the model are saved with the function
+    module.predict = tf.function(lambda features: model(features, training=False),
+                                 input_signature=[tf.TensorSpec(shape=[None, FEATURES_NUM], dtype=tf.float32)])
+    tf.saved_model.save(module, cache_path)
+    with open(os.path.join(cache_path, "stamp.json"), "w") as file:
+        json.dump(stamp, file)
+
+
+def load_predict_cache(cache_path: str, stamp: dict) -> Union[Callable[[np.ndarray], np.ndarray], None]:
+    """ :returns None if there is no cache for this version of the model """
+    try:
+        with open(os.path.join(cache_path, "stamp.json")) as file:
+            if json.load(file) != stamp:
+                return None
+    except (OSError, ValueError):
+        return None
+    import tensorflow as tf
+    module = tf.saved_model.load(cache_path)
+    return lambda features: module.predict(features).numpy()
+
+
+def load_predict(model_path: str, cache_path: Union[str, None] = None) -> Callable[[np.ndarray], np.ndarray]:
+    """ Scoring function of the model, from the cache if it was made from the same model file """
+    stamp = get_model_stamp(model_path)
+    if cache_path:
+        predict = load_predict_cache(cache_path, stamp)
+        if predict is not None:
+            return predict
+    from tensorflow.keras.models import load_model
+    model = load_model(model_path)
+    if cache_path:
+        try:
+            save_predict_cache(model, cache_path, stamp)
+        except Exception as e:
+            print(f"The model cache could not be saved: {e}")
+    return compile_predict(model)
+
+
+def warm_up(predict: Callable[[np.ndarray], np.ndarray]) -> None:
+    """ The first call traces the function, so it is made before the first real sample """
+    predict(np.zeros((1, FEATURES_NUM), dtype=np.float32))
+
+
+class ModelLoader(threading.Thread):
+    """ Loads and warms up the model without blocking the window
+    predict is set once the model is ready, error if it could not be loaded
+    """
+    def __init__(self, model_path: str, cache_path: Union[str, None] = None):
+        super().__init__(daemon=True)
+        self.model_path = model_path
+        self.cache_path = cache_path
+        self.predict = None
+        self.error = None
+        self.load_time = None  # s
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        try:
+            predict = load_predict(self.model_path, self.cache_path)
+            warm_up(predict)
+        except Exception as e:
+            self.error = e
+            print(f"The model could not be loaded: {e}")
+            return
+        self.load_time = time.perf_counter() - start
+        self.predict = predict
+
+    def is_ready(self) -> bool:
+        return self.predict is not None
+
+
+def is_alarm(predictions: np.ndarray) -> np.ndarray:
+    """ Class 0 of the model is the bad posture """
+    return predictions[:, 0] == 0
+
+
+class PostureDetector:
+    """ Scores the samples with the compiled model in batches of up to max_batch rows """
+    def __init__(self, predict: Callable[[np.ndarray], np.ndarray], max_batch=4096):
+        self.predict = predict
+        self.max_batch = max_batch
+
+    def score(self, values_2: np.ndarray, values_4: np.ndarray, user_features: np.ndarray) -> np.ndarray:
+        """ :returns predictions, one row per sample """
+        features = get_features(values_2, values_4, user_features)
+        return np.vstack([self.predict(features[i:i + self.max_batch])
+                          for i in range(0, len(features), self.max_batch)])
+
+
+class DetectionWorker(threading.Thread):
+    """ Detection in its own thread, independent of the frame rate of the graph
+    The main loop submits every sample once, with its absolute index in the sensor buffer.
+    The worker scores everything submitted since its previous pass in one batch
+    and puts the alarms to the queue as (sample index, timestamp, prediction).
+    If the worker falls behind by more than capacity batches, the oldest are dropped and counted
+    """
+    def __init__(self, predict: Callable[[np.ndarray], np.ndarray], sensor_names: list[str],
+                 sensor_2="Sensor 2", sensor_4="Sensor 4", capacity=1000):
+        super().__init__(daemon=True)
+        self.detector = PostureDetector(predict)
+        self.columns = (sensor_names.index(sensor_2), sensor_names.index(sensor_4))
+        self.samples = queue.Queue(maxsize=capacity)
+        self.alarms = queue.Queue()
+        self.is_stopped = False
+        self.scored_num = 0
+        self.dropped_num = 0  # samples
+        self.failed_num = 0  # passes
+        self.latency = LatencyRecorder()
+
+    def submit(self, start_index: int, values: np.ndarray, timestamp, user_features) -> None:
+        """ Samples without user features are not scored """
+        batch = (start_index, values, timestamp, user_features)
+        while True:
+            try:
+                self.samples.put_nowait(batch)
+                return
+            except queue.Full:
+                pass
+            try:
+                _, dropped, _, _ = self.samples.get_nowait()
+            except queue.Empty:
+                continue  # taken by the worker meanwhile
+            self.dropped_num += len(dropped)
+            self.samples.task_done()
+
+    def run(self) -> None:
+        while not self.is_stopped:
+            try:
+                batches = [self.samples.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batches.append(self.samples.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.latency.measure("score"):
+                    self.score_batches(batches)
+            except Exception as e:
+                # e.g. bad user features or a model error, the next batches are still scored
+                self.failed_num += 1
+                print(f"Detection of {len(batches)} batches failed: {e}", file=sys.stderr)
+            finally:
+                for _ in batches:
+                    self.samples.task_done()
+
+    def score_batches(self, batches: list[tuple]) -> None:
+        batches = [batch for batch in batches if batch[3] is not None]
+        if not batches:
+            return
+        column_2, column_4 = self.columns
+        predictions = np.vstack([self.detector.score(values[:, column_2], values[:, column_4], user_features)
+                                 for _, values, _, user_features in batches])
+        alarms = np.flatnonzero(is_alarm(predictions))
+        offset = 0
+        for start_index, values, timestamp, _ in batches:
+            for row in alarms[(alarms >= offset) & (alarms < offset + len(values))]:
+                self.alarms.put((start_index + int(row) - offset, timestamp, float(predictions[row, 0])))
+            offset += len(values)
+        self.scored_num += offset
+
+    def get_alarms(self) -> list[tuple]:
+        """ Alarms detected since the previous call """
+        alarms = []
+        while True:
+            try:
+                alarms.append(self.alarms.get_nowait())
+            except queue.Empty:
+                return alarms
+
+    def stop(self) -> None:
+        self.is_stopped = True
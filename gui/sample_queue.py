@@ -0,0 +1,51 @@
+import threading
+from collections import deque
+import numpy as np
+
+
+class SampleQueue:
+    """ Bounded handoff of the sample batches from the reading thread to the Tk main loop
+    The reading thread publishes every batch it has parsed,
+    the main loop drains all of them once per frame.
+    If the main loop falls behind by more than capacity samples,
+    the oldest batches are dropped and counted
+    """
+    capacity: int
+    depth: int
+    max_depth: int
+    published_num: int
+    dropped_num: int
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity  # samples
+        self.batches = deque()
+        self.lock = threading.Lock()
+        self.depth = 0  # samples waiting to be drained
+        self.max_depth = 0
+        self.published_num = 0
+        self.dropped_num = 0
+
+    def publish(self, values, timestamp) -> None:
+        """ Add the batch of the shape (n, number of sensors) received at the timestamp """
+        values = np.asarray(values)
+        with self.lock:
+            self.batches.append((values, timestamp))
+            self.depth += len(values)
+            self.published_num += len(values)
+            while self.depth > self.capacity and len(self.batches) > 1:
+                dropped, _ = self.batches.popleft()
+                self.depth -= len(dropped)
+                self.dropped_num += len(dropped)
+            self.max_depth = max(self.max_depth, self.depth)
+
+    def drain(self) -> list[tuple]:
+        """ Take every waiting batch as a list of (values, timestamp) """
+        with self.lock:
+            batches = list(self.batches)
+            self.batches.clear()
+            self.depth = 0
+        return batches
+
+    def __repr__(self) -> str:
+        return f"{self.depth} samples waiting (max {self.max_depth}), " \
+               f"{self.dropped_num}/{self.published_num} samples dropped"
@@ -0,0 +1,195 @@
+import os
+import datetime
+from typing import Union
+import numpy as np
+
+
+def format_times(times: np.ndarray, time_format: str) -> np.ndarray:
+    """ Timestamps (epoch ns) as strings of the local time, every distinct second is formatted once """
+    seconds, inverse = np.unique(np.asarray(times, dtype=np.int64) // 1_000_000_000, return_inverse=True)
+    strings = [datetime.datetime.fromtimestamp(second).strftime(time_format) for second in seconds.tolist()]
+    return np.array(strings, dtype=object)[inverse]
+
+
+class SensorBuffer:
+    """ Fixed-capacity ring buffer of sensor samples and their timestamps
+
+    Every sample is written twice (at pos and pos + capacity), so any window
+    of up to capacity samples is one contiguous slice and is returned as a view.
+    Samples are addressed by their absolute index since the start of the session:
+    index 0 is the first sample ever received, even if it has been evicted.
+    When spill_path is given, samples are appended to that file as raw records
+    before they are overwritten, in blocks of spill_chunk samples.
+    Timestamps are the epoch time of receipt (ns), see format_times for the display.
+    """
+    sensor_names: list[str]
+    capacity: int
+    total: int
+    spilled: int
+
+    def __init__(self, sensor_names: list[str], capacity: int,
+                 time_dtype=np.int64, value_dtype=np.float64,
+                 spill_path: Union[str, None] = None, spill_chunk=1000):
+        self.sensor_names = list(sensor_names)
+        self.capacity = capacity
+        self.values = np.zeros((2 * capacity, len(self.sensor_names)), dtype=value_dtype)
+        self.times = np.zeros(2 * capacity, dtype=time_dtype)
+        self.record_dtype = np.dtype([('time', self.times.dtype),
+                                      ('values', self.values.dtype, (len(self.sensor_names),))])
+        self.total = 0  # number of samples ever appended
+        self.written = 0  # samples written to the storage, ahead of total while they are being written
+        self.spilled = 0  # number of oldest samples already written to the spill file
+        self.spill_path = spill_path
+        self.spill_chunk = min(spill_chunk, capacity)
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    @property
+    def first_index(self) -> int:
+        """ Absolute index of the oldest sample still kept in memory """
+        total = self.total  # read once, it is also used from other threads
+        return total - min(total, self.capacity)
+
+    def append(self, values, timestamp) -> None:
+        """ Add one sample; values are ordered as sensor_names """
+        if self.total >= self.capacity and self.spill_path is not None:
+            self.spill_before(self.total - self.capacity + 1)
+        pos = self.total % self.capacity
+        self.written = self.total + 1
+        self.values[pos] = values
+        self.values[pos + self.capacity] = values
+        self.times[pos] = timestamp
+        self.times[pos + self.capacity] = timestamp
+        self.total += 1
+
+    def extend(self, values: np.ndarray, timestamps) -> None:
+        """ Add the samples of the shape (n, number of sensors)
+        timestamps is an array of n timestamps or one timestamp for all of them
+        """
+        values = np.asarray(values).reshape(-1, len(self.sensor_names))
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=self.times.dtype), len(values))
+        for start in range(0, len(values), self.capacity):
+            stop = start + self.capacity
+            self.extend_chunk(values[start:stop], timestamps[start:stop])
+
+    def extend_chunk(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """ Add up to capacity samples, written as at most two slices per half of the storage """
+        number = len(values)
+        if self.spill_path is not None:
+            self.spill_before(self.total + number - self.capacity)
+        pos = self.total % self.capacity
+        self.written = self.total + number
+        first = min(number, self.capacity - pos)
+        rest = number - first
+        for offset in (0, self.capacity):
+            self.values[offset + pos:offset + pos + first] = values[:first]
+            self.times[offset + pos:offset + pos + first] = timestamps[:first]
+            self.values[offset:offset + rest] = values[first:]
+            self.times[offset:offset + rest] = timestamps[first:]
+        self.total += number
+
+    def last(self, sensor: str, default=None):
+        """ Most recent value of the sensor or default if nothing has been received """
+        if self.total == 0:
+            return default
+        pos = (self.total - 1) % self.capacity
+        return self.values[pos, self.sensor_names.index(sensor)]
+
+    def clip_range(self, lower: Union[int, None], upper: Union[int, None]) -> tuple[int, int]:
+        """ Limit the absolute range [lower, upper) to the samples kept in memory """
+        lower = self.first_index if lower is None else max(int(lower), self.first_index)
+        upper = self.total if upper is None else min(int(upper), self.total)
+        return lower, max(lower, upper)
+
+    def get_window(self, lower=None, upper=None) -> tuple[np.ndarray, np.ndarray]:
+        """ Zero-copy views of (values, times) for absolute indices [lower, upper)
+        values have the shape (n, number of sensors)
+        """
+        lower, upper = self.clip_range(lower, upper)
+        start = self.to_position(lower)
+        stop = start + upper - lower
+        return self.values[start:stop], self.times[start:stop]
+
+    def get_sensor(self, sensor: str, lower=None, upper=None) -> np.ndarray:
+        values, _ = self.get_window(lower, upper)
+        return values[:, self.sensor_names.index(sensor)]
+
+    def get_times(self, lower=None, upper=None) -> np.ndarray:
+        _, times = self.get_window(lower, upper)
+        return times
+
+    def to_position(self, index: int) -> int:
+        """ Position of the absolute index inside the storage """
+        total = self.total  # read once, it is also used from other threads
+        oldest_pos = total % self.capacity if total >= self.capacity else 0
+        return oldest_pos + index - (total - min(total, self.capacity))
+
+    """ Spilling of the evicted samples """
+
+    def spill_before(self, index: int) -> None:
+        """ Make sure every sample older than the absolute index is written to the spill file """
+        while self.spilled < index:
+            upper = min(self.spilled + self.spill_chunk, self.total)
+            values, times = self.get_window(self.spilled, upper)
+            records = np.empty(len(values), dtype=self.record_dtype)
+            records['time'] = times
+            records['values'] = values
+            with open(self.spill_path, 'ab') as file:
+                records.tofile(file)
+            self.spilled = upper
+
+    def read_spilled(self) -> np.ndarray:
+        """ Load the spilled records; fields are 'time' and 'values' """
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return np.empty(0, dtype=self.record_dtype)
+        return np.fromfile(self.spill_path, dtype=self.record_dtype)
+
+    def map_spilled(self) -> np.ndarray:
+        """ Spilled records mapped with numpy.memmap, read from the disk only when used """
+        if self.spill_path is None or not os.path.exists(self.spill_path) or self.spilled == 0:
+            return np.empty(0, dtype=self.record_dtype)
+        return np.memmap(self.spill_path, dtype=self.record_dtype, mode='r', shape=(self.spilled,))
+
+    def iter_chunks(self, lower=None, upper=None, chunk=100_000):
+        """ Copies of (values, times) of [lower, upper) in chunks of up to chunk samples,
+        the evicted samples are read from the spill file if there is one.
+        Safe to use from another thread while the samples are added:
+        a chunk overwritten while it was copied is read again, from the spill file if it was evicted
+        """
+        lower = 0 if lower is None else max(int(lower), 0)
+        upper = self.total if upper is None else min(int(upper), self.total)
+        start = lower
+        while start < upper:
+            stop = min(start + chunk, upper)
+            first_index = self.first_index  # moves forward while the samples are added
+            if start < first_index:
+                if self.spilled <= start:
+                    start = first_index  # the evicted samples were not kept
+                    continue
+                records = self.map_spilled()[start:min(stop, first_index)]
+                values, times = records['values'].copy(), records['time'].copy()
+            else:
+                position = self.to_position(start)
+                values = self.values[position:position + stop - start].copy()
+                times = self.times[position:position + stop - start].copy()
+                if self.written > start + self.capacity:
+                    continue  # the oldest samples of the copy were overwritten meanwhile
+            start += len(values)
+            if len(values) == 0:
+                return
+            yield values, times
+
+    def load_history(self, lower=0) -> tuple[np.ndarray, np.ndarray]:
+        """ Copies of (values, times) from the sample number lower, including the spilled samples
+        Spilled samples which are still kept in memory are taken from memory
+        """
+        first_index = self.first_index
+        records = self.read_spilled()[lower:first_index]
+        values, times = self.get_window(max(lower, first_index))
+        return (np.concatenate([records['values'], values]),
+                np.concatenate([records['time'], times]))
+
+    def to_dict(self, values: np.ndarray) -> dict:
+        """ Convert (n, number of sensors) array to the {"Sensor #": column} format """
+        return {name: values[:, i] for i, name in enumerate(self.sensor_names)}
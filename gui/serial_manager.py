@@ -1,9 +1,11 @@
 import serial
+import ui_config
 # Xijun is still debugging this file
 class SerialManager:
     _instance = None
 
-    def __new__(cls, port='COM8', baudrate=115200, timeout=1):
+    def __new__(cls, port=ui_config.Measurements.serial_port.value,
+                baudrate=ui_config.Measurements.serial_baudrate.value, timeout=1):
         if cls._instance is None:
             cls._instance = super(SerialManager, cls).__new__(cls)
             try:
@@ -11,6 +13,7 @@ class SerialManager:
             except serial.SerialException as e:
                 print(f"Error opening serial port: {e}")
                 cls._instance.ser = None
+            cls._instance.line_reader = SerialLineReader(cls._instance.ser) if cls._instance.ser else None
         return cls._instance
 
     def read_line(self):
@@ -19,6 +22,49 @@ class SerialManager:
             return line
         return None
 
+    def read_lines(self) -> list[bytes]:
+        """ Read every complete line received so far, waiting up to the timeout for new data """
+        if self.line_reader is None:
+            return []
+        return self.line_reader.read_lines()
+
     def close(self):
         if self.ser:
             self.ser.close()
+
+
+class SerialLineReader:
+    """ Bulk reader of the newline separated messages from the serial port
+    Waits up to the port timeout for the first byte, then takes everything
+    the port has received in one read instead of polling line by line.
+    An incomplete last line is kept in the buffer until the rest arrives.
+    If the recorder is given, the raw bytes are also written to the recording
+    """
+    def __init__(self, ser: serial.Serial, max_read=65536, recorder=None):
+        self.ser = ser
+        self.max_read = max_read
+        self.recorder = recorder
+        self.buffer = bytearray()
+        self.bytes_num = 0
+        self.lines_num = 0
+
+    def read_lines(self) -> list[bytes]:
+        size = min(max(1, self.ser.in_waiting), self.max_read)
+        data = self.ser.read(size)
+        if not data:
+            return []  # timeout
+        return self.add_data(data)
+
+    def add_data(self, data: bytes) -> list[bytes]:
+        """ Complete lines of the received bytes, also used by the asyncio reader of async_acquisition.py """
+        self.bytes_num += len(data)
+        if self.recorder is not None:
+            self.recorder.write(data)
+        self.buffer += data
+        end = self.buffer.rfind(b'\n')
+        if end < 0:
+            return []
+        lines = bytes(self.buffer[:end]).split(b'\n')
+        del self.buffer[:end + 1]
+        self.lines_num += len(lines)
+        return [line.rstrip(b'\r') for line in lines]
@@ -0,0 +1,193 @@
+""" Recording and replay of the raw serial stream of the device
+
+A recording is a binary file of chunks, one per read from the port:
+    int64 time since the start of the recording (ns), uint32 length, the bytes
+VirtualSerialDevice replays a recording through a pseudo-terminal (Linux/macOS),
+so the app reads it with serial.Serial(device.port) as if it was the device.
+
+Usage:
+    python serial_replay.py record <file> --port COM8 --duration 60
+    python serial_replay.py synthetic <file> --rate 50 --duration 600
+    python serial_replay.py replay <file> --speed 10 --jitter 0.001 --corruption 0.01
+"""
+
+import os
+import sys
+import time
+import random
+import struct
+import argparse
+import threading
+from typing import Iterator, Union
+import serial
+import ui_config
+
+CHUNK_HEADER = struct.Struct("<qI")
+
+
+class SerialRecorder:
+    """ Write the received bytes with the time of receipt to the recording file
+    An existing file is overwritten, the times of a recording start from zero once
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "wb")
+        self.start_time = time.monotonic_ns()
+
+    def write(self, data: bytes, chunk_time: Union[int, None] = None) -> None:
+        """ chunk_time is the time since the start (ns), the current time by default """
+        if chunk_time is None:
+            chunk_time = time.monotonic_ns() - self.start_time
+        self.file.write(CHUNK_HEADER.pack(chunk_time, len(data)))
+        self.file.write(data)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_recording(path: str) -> Iterator[tuple[int, bytes]]:
+    """ Chunks of the recording as (time since the start (ns), bytes) """
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                return
+            chunk_time, length = CHUNK_HEADER.unpack(header)
+            yield chunk_time, file.read(length)
+
+
+def create_synthetic_recording(path: str, rate: float, duration: float) -> None:
+    """ Recording of the device messages with random distances at the rate (lines/s) """
+    recorder = SerialRecorder(path)
+    period_ns = int(1e9 / rate)
+    value_1, value_2 = 600, 650
+    for i in range(int(rate * duration)):
+        value_1 = min(max(value_1 + random.randint(-5, 5), 300), 900)
+        value_2 = min(max(value_2 + random.randint(-5, 5), 300), 900)
+        line = f"Range, {value_1}, {value_2}, mm\r\n".encode()
+        recorder.write(line, chunk_time=i * period_ns)
+    recorder.close()
+
+
+class VirtualSerialDevice:
+    """ Pseudo-terminal which replays the recording at `speed` times of the recorded rate
+    :param jitter is the largest random delay (s) added to every chunk
+    :param corruption is the chance of every chunk to lose or change one byte
+    """
+    def __init__(self, recording_path: str, speed=1.0, jitter=0.0, corruption=0.0, loop=False):
+        import tty
+        self.recording_path = recording_path
+        self.speed = speed
+        self.jitter = jitter
+        self.corruption = corruption
+        self.loop = loop
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port: str = os.ttyname(self.slave_fd)
+        self.is_stopped = False
+        self.bytes_num = 0
+        self.chunks_num = 0
+        self.corrupted_num = 0
+        self.thread = threading.Thread(target=self.replay, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.is_stopped = True
+        if self.thread.is_alive():
+            self.thread.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def is_done(self) -> bool:
+        return not self.thread.is_alive()
+
+    def replay(self) -> None:
+        while not self.is_stopped:
+            start = time.perf_counter()
+            for chunk_time, data in read_recording(self.recording_path):
+                if self.is_stopped:
+                    return
+                send_time = start + chunk_time / 1e9 / self.speed + random.uniform(0, self.jitter)
+                delay = send_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self.send(data)
+            if not self.loop:
+                return
+
+    def send(self, data: bytes) -> None:
+        if data and random.random() < self.corruption:
+            data = self.corrupt(data)
+            self.corrupted_num += 1
+        os.write(self.master_fd, data)
+        self.bytes_num += len(data)
+        self.chunks_num += 1
+
+    @staticmethod
+    def corrupt(data: bytes) -> bytes:
+        pos = random.randrange(len(data))
+        if random.random() < 0.5:
+            return data[:pos] + data[pos + 1:]  # lost byte
+        return data[:pos] + bytes([random.randrange(256)]) + data[pos + 1:]
+
+
+def record(path: str, port: str, duration: Union[float, None]) -> None:
+    """ Record the raw stream of the device until the duration (s) or Ctrl+C """
+    from serial_manager import SerialLineReader
+    ser = serial.Serial(port, ui_config.Measurements.serial_baudrate.value,
+                        timeout=ui_config.Measurements.serial_timeout.value)
+    recorder = SerialRecorder(path)
+    reader = SerialLineReader(ser, recorder=recorder)
+    end_time = time.time() + duration if duration else None
+    try:
+        while end_time is None or time.time() < end_time:
+            reader.read_lines()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        ser.close()
+    print(f"Recorded {reader.bytes_num} bytes, {reader.lines_num} lines to {path}")
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description="Record or replay the serial stream of the device")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record")
+    record_parser.add_argument("file")
+    record_parser.add_argument("--port", default=ui_config.Measurements.serial_port.value)
+    record_parser.add_argument("--duration", type=float, default=None, help="s")
+    synthetic_parser = commands.add_parser("synthetic")
+    synthetic_parser.add_argument("file")
+    synthetic_parser.add_argument("--rate", type=float, default=50, help="lines/s")
+    synthetic_parser.add_argument("--duration", type=float, default=600, help="s")
+    replay_parser = commands.add_parser("replay")
+    replay_parser.add_argument("file")
+    replay_parser.add_argument("--speed", type=float, default=1.0)
+    replay_parser.add_argument("--jitter", type=float, default=0.0, help="s")
+    replay_parser.add_argument("--corruption", type=float, default=0.0)
+    replay_parser.add_argument("--loop", action="store_true")
+    options = parser.parse_args(args)
+
+    if options.command == "record":
+        record(options.file, options.port, options.duration)
+    elif options.command == "synthetic":
+        create_synthetic_recording(options.file, options.rate, options.duration)
+    else:
+        device = VirtualSerialDevice(options.file, speed=options.speed, jitter=options.jitter,
+                                     corruption=options.corruption, loop=options.loop)
+        device.start()
+        print(f"Replaying {options.file} on {device.port}, run: python main.py --port {device.port}")
+        try:
+            while not device.is_done():
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        device.stop()
+        print(f"Sent {device.bytes_num} bytes in {device.chunks_num} chunks, {device.corrupted_num} corrupted")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
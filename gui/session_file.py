@@ -0,0 +1,195 @@
+""" Columnar session file, opened with numpy.memmap so only the viewed range is read from the disk
+
+The file is:
+    MAGIC, uint32 length of the JSON header,
+    the header {"sensor_names": [...], "samples_num": n, "time_dtype": "<i8", "value_dtype": "<f8",
+                "data_offset": bytes, "user_id": id or null, "alarms_num": m}
+    from data_offset: n timestamps (epoch ns), then n values of every sensor in the order of sensor_names,
+    then m alarm times (epoch ns); the files saved before the alarms were added have no user_id and alarms
+
+Usage:
+    python session_file.py convert <session log or CSV> --output <file>.session
+    python session_file.py info <file>.session
+"""
+
+import os
+import sys
+import json
+import struct
+import argparse
+import datetime
+from typing import Union
+import numpy as np
+
+MAGIC = b"PSCOL\x00\x01\n"
+LENGTH = struct.Struct("<I")
+ALIGNMENT = 64  # bytes, the columns start at aligned offsets
+TIME_DTYPE = np.dtype('<i8')
+VALUE_DTYPE = np.dtype('<f8')
+
+
+def save_session_file(path: str, sensor_names: list[str], times: np.ndarray, values: np.ndarray,
+                      alarm_times=(), user_id: Union[int, None] = None) -> None:
+    """ values have the shape (n, number of sensors) in the order of sensor_names """
+    samples_num = len(times)
+    header = {"sensor_names": list(sensor_names),
+              "samples_num": samples_num,
+              "time_dtype": TIME_DTYPE.str,
+              "value_dtype": VALUE_DTYPE.str,
+              "data_offset": 0,
+              "user_id": user_id,
+              "alarms_num": len(alarm_times)}
+    # the offset is a part of the header, so its length is found with the largest offset first
+    header_size = len(MAGIC) + LENGTH.size + len(json.dumps({**header, "data_offset": 2 ** 40}))
+    header["data_offset"] = -(-header_size // ALIGNMENT) * ALIGNMENT
+    content = json.dumps(header).encode()
+    with open(path, "wb") as file:
+        file.write(MAGIC + LENGTH.pack(len(content)) + content)
+        file.write(b"\x00" * (header["data_offset"] - file.tell()))
+        np.ascontiguousarray(times, dtype=TIME_DTYPE).tofile(file)
+        for i in range(len(sensor_names)):
+            np.ascontiguousarray(values[:, i], dtype=VALUE_DTYPE).tofile(file)
+        np.asarray(alarm_times, dtype=TIME_DTYPE).tofile(file)
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session file")
+        (length,) = LENGTH.unpack(file.read(LENGTH.size))
+        return json.loads(file.read(length))
+
+
+class SessionFile:
+    """ Saved session with the same reading methods as SensorBuffer,
+    so the graph can page through it; samples are addressed from 0
+    """
+    sensor_names: list[str]
+    total: int
+    user_id: Union[int, None]
+
+    def __init__(self, path: str):
+        self.path = path
+        header = read_header(path)
+        self.sensor_names = header["sensor_names"]
+        self.total = header["samples_num"]
+        self.user_id = header.get("user_id")
+        time_dtype = np.dtype(header["time_dtype"])
+        value_dtype = np.dtype(header["value_dtype"])
+        offset = header["data_offset"]
+        self.times = self.map_column(time_dtype, offset, self.total)
+        offset += self.total * time_dtype.itemsize
+        self.columns = list()
+        for _ in self.sensor_names:
+            self.columns.append(self.map_column(value_dtype, offset, self.total))
+            offset += self.total * value_dtype.itemsize
+        self.alarm_times = self.map_column(time_dtype, offset, header.get("alarms_num", 0))
+
+    def map_column(self, dtype: np.dtype, offset: int, length: int) -> np.ndarray:
+        if length == 0:
+            return np.empty(0, dtype=dtype)  # memmap can not map 0 bytes
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=(length,))
+
+    def __len__(self) -> int:
+        return self.total
+
+    @property
+    def first_index(self) -> int:
+        return 0
+
+    def clip_range(self, lower: Union[int, None], upper: Union[int, None]) -> tuple[int, int]:
+        lower = 0 if lower is None else max(int(lower), 0)
+        upper = self.total if upper is None else min(int(upper), self.total)
+        return lower, max(lower, upper)
+
+    def get_sensor(self, sensor: str, lower=None, upper=None) -> np.ndarray:
+        """ View of the file, the values are read when used """
+        lower, upper = self.clip_range(lower, upper)
+        return self.columns[self.sensor_names.index(sensor)][lower:upper]
+
+    def get_times(self, lower=None, upper=None) -> np.ndarray:
+        lower, upper = self.clip_range(lower, upper)
+        return self.times[lower:upper]
+
+    def get_window(self, lower=None, upper=None) -> tuple[np.ndarray, np.ndarray]:
+        """ (values, times) for [lower, upper), values are copied to the shape (n, number of sensors) """
+        lower, upper = self.clip_range(lower, upper)
+        values = np.column_stack([column[lower:upper] for column in self.columns]) \
+            if self.columns else np.empty((upper - lower, 0))
+        return values, self.times[lower:upper]
+
+    def iter_chunks(self, lower=None, upper=None, chunk=100_000):
+        """ (values, times) of [lower, upper) in chunks of up to chunk samples """
+        lower, upper = self.clip_range(lower, upper)
+        for start in range(lower, upper, chunk):
+            yield self.get_window(start, min(start + chunk, upper))
+
+    def to_dict(self, values: np.ndarray) -> dict:
+        return {name: values[:, i] for i, name in enumerate(self.sensor_names)}
+
+    def close(self) -> None:
+        """ Release the mapping of the file """
+        self.times = None
+        self.columns = list()
+        self.alarm_times = None
+
+
+def convert(source_path: str, output_path: Union[str, None] = None) -> str:
+    """ Convert a session log (session_log.py) or a CSV saved by the app to the session file
+    The old CSVs without the Time column get one sample every thread_delay from the modification time of the file
+    """
+    from session_log import MAGIC as LOG_MAGIC, read_session_log
+    if output_path is None:
+        output_path = os.path.splitext(source_path)[0] + ".session"
+    with open(source_path, "rb") as file:
+        is_log = file.read(len(LOG_MAGIC)) == LOG_MAGIC
+    if not is_log:  # CSV, also without the extension, e.g. data/values/0
+        import pandas as pd
+        import ui_config
+        df = pd.read_csv(source_path)
+        sensor_names = [name for name in df.columns if name.startswith("Sensor")]
+        if "Time" in df.columns:
+            # the CSV keeps the local time to the second, every distinct string is parsed once
+            strings, inverse = np.unique(df["Time"].to_numpy(dtype=str), return_inverse=True)
+            time_format: str = ui_config.Measurements.time_format.value
+            seconds = [datetime.datetime.strptime(string, time_format).timestamp() for string in strings]
+            times = np.array(seconds, dtype=np.int64)[inverse] * 1_000_000_000
+        else:
+            period = int(ui_config.Measurements.thread_delay.value * 1e9)
+            times = os.stat(source_path).st_mtime_ns + np.arange(len(df), dtype=np.int64) * period
+            print(f"{source_path} has no Time column, the times are made from the sample numbers")
+        values = df[sensor_names].to_numpy(dtype=np.float64)
+    else:
+        log = read_session_log(source_path)
+        sensor_names, times, values = log["sensor_names"], log["times"], log["values"]
+    # the app names the CSV and the log after the id of the user, e.g. 3.csv
+    name = os.path.basename(os.path.splitext(source_path)[0])
+    user_id = int(name) if name.lstrip("-").isdigit() else None
+    save_session_file(output_path, sensor_names, times, values, user_id=user_id)
+    print(f"{len(times)} samples of {source_path} saved to {output_path}")
+    return output_path
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description="Convert or inspect the columnar session files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert")
+    convert_parser.add_argument("file", help="session log or CSV")
+    convert_parser.add_argument("--output", default=None, help="next to the source by default")
+    info_parser = commands.add_parser("info")
+    info_parser.add_argument("file")
+    options = parser.parse_args(args)
+
+    if options.command == "convert":
+        convert(options.file, options.output)
+    else:
+        session = SessionFile(options.file)
+        times = session.get_times()
+        duration = (times[-1] - times[0]) / 1e9 if len(times) else 0.0
+        print(f"Sensors: {', '.join(session.sensor_names)}")
+        print(f"Samples: {len(session)} over {duration:.1f} s")
+        print(f"User: {session.user_id}, alarms: {len(session.alarm_times)}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
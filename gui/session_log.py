@@ -0,0 +1,205 @@
+""" Crash-safe log of all samples of a session, written while the data arrives
+
+The log is a binary file:
+    MAGIC, uint32 length of the JSON header, the header {"sensor_names": [...], "start_time": epoch ns}
+    chunks: uint32 number of samples, uint32 crc32 of the data, the samples as records of
+            int64 time (epoch ns) and float64 value of every sensor
+    end marker: a chunk of 0 samples, written only when the log is closed
+Every chunk holds up to chunk_size samples; a smaller chunk is written when the log is synced.
+After a crash the log is valid up to the last complete chunk, which recover() turns into CSV.
+
+Usage:
+    python session_log.py info <log>
+    python session_log.py recover <log> --output data.csv
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import struct
+import argparse
+import threading
+from typing import Union
+import numpy as np
+import ui_config
+
+MAGIC = b"PSLOG\x00\x01\n"
+LENGTH = struct.Struct("<I")
+CHUNK_HEADER = struct.Struct("<II")
+
+
+def get_record_dtype(sensors_num: int) -> np.dtype:
+    return np.dtype([('time', np.int64), ('values', np.float64, (sensors_num,))])
+
+
+class SessionLogWriter(threading.Thread):
+    """ Appends the samples to the log in its own thread
+    The data is written in chunks of chunk_size samples and synced to the disk
+    at least every fsync_interval (s), so a crash loses at most the last interval
+    """
+    def __init__(self, path: str, sensor_names: list[str], chunk_size=1000, fsync_interval=1.0):
+        super().__init__(daemon=True)
+        self.path = path
+        self.sensor_names = list(sensor_names)
+        self.record_dtype = get_record_dtype(len(self.sensor_names))
+        self.chunk_size = chunk_size
+        self.fsync_interval = fsync_interval
+        self.batches = queue.Queue()
+        self.pending = list()  # record arrays not written yet
+        self.pending_num = 0
+        self.samples_num = 0
+        self.chunks_num = 0
+        self.syncs_num = 0
+        self.file = open(path, "wb")
+        header = json.dumps({"sensor_names": self.sensor_names, "start_time": time.time_ns()}).encode()
+        self.file.write(MAGIC + LENGTH.pack(len(header)) + header)
+        self.sync()
+
+    def append(self, values: np.ndarray, timestamps) -> None:
+        """ Safe to call from any thread; values have the shape (n, number of sensors) """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.sensor_names))
+        records = np.empty(len(values), dtype=self.record_dtype)
+        records['time'] = timestamps
+        records['values'] = values
+        self.batches.put(records)
+
+    def close(self) -> None:
+        """ Write the remaining samples and the end marker """
+        self.batches.put(None)
+        if self.is_alive():
+            self.join()
+
+    def run(self) -> None:
+        last_sync = time.monotonic()
+        while True:
+            try:
+                records = self.batches.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                records = np.empty(0, dtype=self.record_dtype)
+            if records is None:
+                break
+            self.pending.append(records)
+            self.pending_num += len(records)
+            if self.pending_num >= self.chunk_size:
+                self.write_chunks(full_only=True)
+            if time.monotonic() - last_sync >= self.fsync_interval:
+                self.write_chunks()
+                self.sync()
+                last_sync = time.monotonic()
+        self.write_chunks()
+        self.file.write(CHUNK_HEADER.pack(0, 0))
+        self.sync()
+        self.file.close()
+
+    def write_chunks(self, full_only=False) -> None:
+        if not self.pending_num:
+            return
+        records = np.concatenate(self.pending)
+        end = len(records) - len(records) % self.chunk_size if full_only else len(records)
+        for start in range(0, end, self.chunk_size):
+            data = records[start:min(start + self.chunk_size, end)].tobytes()
+            self.file.write(CHUNK_HEADER.pack(len(data) // self.record_dtype.itemsize, zlib.crc32(data)))
+            self.file.write(data)
+            self.chunks_num += 1
+        self.samples_num += end
+        self.pending = [records[end:]] if end < len(records) else []
+        self.pending_num = len(records) - end
+
+    def sync(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.syncs_num += 1
+
+
+def create_session_log(sensor_names: list[str], suffix="") -> Union[SessionLogWriter, None]:
+    """ Started log of the new session in the session log folder, None if the log is disabled
+    suffix tells apart the logs of the devices started at the same second
+    """
+    if not ui_config.Measurements.session_log_enabled.value:
+        return None
+    import datetime
+    folder: str = ui_config.FilePaths.session_log_folder_path.value
+    os.makedirs(folder, exist_ok=True)
+    path = folder + "/session_" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + suffix + ".log"
+    session_log = SessionLogWriter(path, sensor_names,
+                                   chunk_size=ui_config.Measurements.session_log_chunk.value,
+                                   fsync_interval=ui_config.Measurements.session_log_fsync_interval.value / 1000)
+    session_log.start()
+    return session_log
+
+
+def read_session_log(path: str) -> dict:
+    """ {"sensor_names": [...], "start_time": ns, "times": ns array, "values": (n, sensors) array,
+    "is_complete": False if the log has no end marker, e.g. after a crash}
+    Reading stops at the first incomplete or damaged chunk
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session log")
+        (length,) = LENGTH.unpack(file.read(LENGTH.size))
+        header: dict = json.loads(file.read(length))
+        record_dtype = get_record_dtype(len(header["sensor_names"]))
+        chunks = []
+        is_complete = False
+        while True:
+            chunk_header = file.read(CHUNK_HEADER.size)
+            if len(chunk_header) < CHUNK_HEADER.size:
+                break
+            samples_num, crc = CHUNK_HEADER.unpack(chunk_header)
+            if samples_num == 0:
+                is_complete = True
+                break
+            data = file.read(samples_num * record_dtype.itemsize)
+            if len(data) < samples_num * record_dtype.itemsize or zlib.crc32(data) != crc:
+                break
+            chunks.append(np.frombuffer(data, dtype=record_dtype))
+    records = np.concatenate(chunks) if chunks else np.empty(0, dtype=record_dtype)
+    return {**header,
+            "times": records['time'],
+            "values": records['values'],
+            "is_complete": is_complete}
+
+
+def recover(path: str, output_path: Union[str, None] = None) -> str:
+    """ Rebuild the CSV of the session in the format of DatabaseManager.save_data
+    :returns the path of the CSV file, next to the log by default
+    """
+    import pandas as pd
+    from sensor_buffer import format_times
+    log = read_session_log(path)
+    if output_path is None:
+        output_path = os.path.splitext(path)[0] + ".csv"
+    df = pd.DataFrame({name: log["values"][:, i] for i, name in enumerate(log["sensor_names"])})
+    df["Time"] = format_times(log["times"], ui_config.Measurements.time_format.value)
+    df.to_csv(output_path, index=False)
+    state = "complete" if log["is_complete"] else "not closed, recovered up to the last complete chunk"
+    print(f"{len(df)} samples of {path} ({state}) saved to {output_path}")
+    return output_path
+
+
+def main(args: list[str]):
+    parser = argparse.ArgumentParser(description="Inspect or recover the session log")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info_parser = commands.add_parser("info")
+    info_parser.add_argument("file")
+    recover_parser = commands.add_parser("recover")
+    recover_parser.add_argument("file")
+    recover_parser.add_argument("--output", default=None, help="CSV file, next to the log by default")
+    options = parser.parse_args(args)
+
+    if options.command == "info":
+        log = read_session_log(options.file)
+        times = log["times"]
+        duration = (times[-1] - times[0]) / 1e9 if len(times) else 0.0
+        print(f"Sensors: {', '.join(log['sensor_names'])}")
+        print(f"Samples: {len(times)} over {duration:.1f} s")
+        print(f"Closed properly: {log['is_complete']}")
+    else:
+        recover(options.file, options.output)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
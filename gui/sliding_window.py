@@ -0,0 +1,78 @@
+from collections import deque
+from sensor_buffer import SensorBuffer
+
+
+class SlidingMinMax:
+    """ Minimum and maximum over the last `window` appended values
+    Both are kept in monotonic deques of (index, value),
+    so every append costs O(1) amortized and every query O(1)
+    """
+    window: int
+    count: int
+
+    def __init__(self, window: int):
+        self.window = window
+        self.count = 0
+        self.min_queue = deque()  # values increase from left to right
+        self.max_queue = deque()  # values decrease from left to right
+
+    def append(self, value) -> None:
+        index = self.count
+        while self.min_queue and self.min_queue[-1][1] >= value:
+            self.min_queue.pop()
+        self.min_queue.append((index, value))
+        while self.max_queue and self.max_queue[-1][1] <= value:
+            self.max_queue.pop()
+        self.max_queue.append((index, value))
+        self.count += 1
+        # Forget the values which left the window
+        oldest = self.count - self.window
+        if self.min_queue[0][0] < oldest:
+            self.min_queue.popleft()
+        if self.max_queue[0][0] < oldest:
+            self.max_queue.popleft()
+
+    def skip(self, number: int) -> None:
+        """ Move the window forward without values, e.g. when older samples are not needed """
+        self.count += number
+        oldest = self.count - self.window
+        while self.min_queue and self.min_queue[0][0] < oldest:
+            self.min_queue.popleft()
+        while self.max_queue and self.max_queue[0][0] < oldest:
+            self.max_queue.popleft()
+
+    def get_min(self, default=None):
+        return self.min_queue[0][1] if self.min_queue else default
+
+    def get_max(self, default=None):
+        return self.max_queue[0][1] if self.max_queue else default
+
+
+class SensorWindowRange:
+    """ Range of the values of all sensors over the last `window` samples of the buffer
+    The new samples are taken from the buffer on update(),
+    so the range is maintained by the thread which reads it
+    """
+    def __init__(self, buffer: SensorBuffer, window: int):
+        self.buffer = buffer
+        self.window = window
+        self.sensors = [SlidingMinMax(window) for _ in buffer.sensor_names]
+        self.fed = 0  # number of the buffer samples seen so far
+
+    def update(self) -> None:
+        total = self.buffer.total
+        start = max(self.fed, total - self.window)
+        if start > self.fed:
+            for sensor in self.sensors:
+                sensor.skip(start - self.fed)
+        values, _ = self.buffer.get_window(start, total)
+        for row in values.tolist():
+            for sensor, value in zip(self.sensors, row):
+                sensor.append(value)
+        self.fed = total
+
+    def get_limits(self) -> tuple:
+        """ (min, max) over every sensor, (0, 1) if there are no values """
+        y_min = min((sensor.get_min() for sensor in self.sensors if sensor.min_queue), default=0)
+        y_max = max((sensor.get_max() for sensor in self.sensors if sensor.max_queue), default=1)
+        return y_min, y_max
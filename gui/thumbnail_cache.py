@@ -0,0 +1,106 @@
+""" Scaled copies of the user photos, so a photo is decoded and resized once
+The thumbnails are kept in memory (least recently used are evicted above capacity)
+and as PNG files in the cache folder (the oldest used are deleted above disk_capacity).
+The key is the path, mtime and size of the photo and the target size,
+so a changed photo gets a new thumbnail.
+get() may be called from any thread; only the Tk image has to be made in the thread of the window
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Union
+
+
+class ThumbnailCache:
+    def __init__(self, folder: Union[str, None], capacity=32, disk_capacity=256):
+        self.folder = folder  # None to keep the thumbnails only in memory
+        self.capacity = capacity
+        self.disk_capacity = disk_capacity
+        self.lock = threading.Lock()
+        self.images = OrderedDict()  # key: PIL image, the most recently used last
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(path: str, w: int, h: int) -> tuple:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size, w, h
+
+    def get_disk_path(self, key: tuple) -> str:
+        return os.path.join(self.folder, hashlib.sha1(repr(key).encode()).hexdigest() + ".png")
+
+    def get_cached(self, path: str, w: int, h: int):
+        """ The thumbnail if it is in memory, otherwise None; does not read the disk """
+        key = self.get_key(path, w, h)
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+                self.hits += 1
+        return image
+
+    def get(self, path: str, w: int, h: int):
+        """ PIL image of the photo scaled to (w, h), from memory, the disk or the photo itself """
+        image = self.get_cached(path, w, h)
+        if image is not None:
+            return image
+        from PIL import Image
+        key = self.get_key(path, w, h)
+        disk_path = self.get_disk_path(key) if self.folder else None
+        if disk_path and os.path.exists(disk_path):
+            with Image.open(disk_path) as file:
+                image = file.copy()
+            os.utime(disk_path)  # the mtime of a thumbnail is the time it was last used
+            self.disk_hits += 1
+        else:
+            with Image.open(path) as file:
+                file.draft("RGB", (w, h))  # a JPEG is decoded at the smallest scale above the target size
+                image = file.resize((w, h), resample=Image.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            self.misses += 1
+            if disk_path:
+                self.save(image, disk_path)
+        self.add(key, image)
+        return image
+
+    def add(self, key: tuple, image) -> None:
+        with self.lock:
+            self.images[key] = image
+            self.images.move_to_end(key)
+            while len(self.images) > self.capacity:
+                self.images.popitem(last=False)
+
+    def save(self, image, disk_path: str) -> None:
+        """ The thumbnail is written to a temporary file first, so a reader never sees a partial one """
+        temp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            image.save(temp_path, format="PNG")
+            os.replace(temp_path, disk_path)
+        except OSError as e:
+            print(f"The thumbnail could not be saved: {e}")
+            return
+        self.trim_disk()
+
+    def trim_disk(self) -> None:
+        """ Delete the least recently used thumbnails above disk_capacity """
+        try:
+            entries = [entry for entry in os.scandir(self.folder) if entry.name.endswith(".png")]
+            if len(entries) <= self.disk_capacity:
+                return
+            entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        except OSError:
+            return  # e.g. a thumbnail deleted by another thread
+        for entry in entries[:len(entries) - self.disk_capacity]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def get_stats(self) -> dict:
+        return {"memory_hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "in_memory": len(self.images)}
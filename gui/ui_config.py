@@ -20,6 +20,8 @@ class ElementNames(Enum):
 
     alarm_num_label = "Number of Alarms"
     processing_time_label = "Processing Time"
+    frame_rate_label = "Frame Rate (FPS)"
+    devices_label = "Devices"
     data_notes_label = "Data Notes"
 
     pause_button_txt = "Pause Graph"
@@ -31,6 +33,7 @@ class ElementNames(Enum):
     register_button_txt = "Register"
     edit_photo_button_txt = "Edit Photo"
     save_selected_button_txt = "Save Selected Data"
+    open_session_button_txt = "Open Session"
 
     sign_in_error = "The user does not exists. Please try again!"
 
@@ -60,18 +63,48 @@ class Measurements(Enum):
     graph_padding_x = 10
     graph_padding_y = 10
     graph_x_limit = 50  # show up to last X values or None for infinite number
+    graph_x_step = 0.2  # part of the window the x-axis moves at once, fewer redraws of the axes
+    graph_y_step = 10  # mm, the y-limits are rounded to it, fewer redraws of the axes
+    graph_max_points = 2000  # points per line of the history view, min/max summaries above it
+    frame_interval = 33  # ms, ~30 FPS
     header_h = 200
     footer_h = 100
 
     photo_h = 50
     photo_w = 50
+    thumbnail_cache_size = 32  # scaled photos kept in memory
+    thumbnail_disk_cache_size = 256  # scaled photos kept in the thumbnail folder
 
     pop_up_closing_delay = 2000  # ms
     thread_delay = 0.01  # s
+    serial_port = 'COM8'
+    serial_baudrate = 115200
+    serial_timeout = 0.1  # s, the longest wait of one read from the serial port
+
+    buffer_capacity = 100_000  # samples kept in memory, the older ones are evicted
+    spill_evicted = False  # append evicted samples to the spill file
+    spill_chunk = 1000  # samples written to the spill file at once
+    sample_queue_capacity = 10_000  # samples waiting for the main loop, the oldest are dropped above it
+    session_log_enabled = True  # write every sample to the session log, see session_log.py
+    session_log_chunk = 1000  # samples written to the session log at once
+    session_log_fsync_interval = 1000  # ms, the most of the data lost by a crash
+    detection_queue_capacity = 1000  # batches waiting for the detection, the oldest are dropped above it
+    alarm_episode_gap = 2.0  # s, the alarms closer than it are one episode of bad posture
+    bcrypt_rounds = 12  # work factor of the new password hashes, every step doubles the time of a check
 
     time_format = "%I:%M:%S %p, %d-%m-%y"
 
 
+def check_bool_aliases(settings) -> None:
+    """ A setting equal to an earlier bool setting, e.g. 1.0 after True, becomes an alias of it and reads the bool """
+    for name, member in settings.__members__.items():
+        if member.name != name and isinstance(member.value, bool):
+            raise ValueError(f"{settings.__name__}.{name} is an alias of {member.name}, give it a distinct value")
+
+
+check_bool_aliases(Measurements)
+
+
 class Fonts(Enum):
     info_panel_font = ("Helvetica", 48)
     button_font = None
@@ -86,10 +119,16 @@ class FilePaths(Enum):
 
     """ Specific file paths """
     user_photo_icon = project_root + '/data/img/user_photo.jpeg'
-    user_login_db_path = project_root + "/data/users/logins.csv"
+    user_login_db_path = project_root + "/data/users/logins.csv"  # moved to user_db_path at the first start
+    user_db_path = project_root + "/data/users/users.db"
+    model_path = project_root + "/model_all.h5"
 
     """ Folder paths """
     values_folder_path = project_root + "/data/values"
+    spill_folder_path = project_root + "/data/values/spill"
+    session_log_folder_path = project_root + "/data/values/sessions"
     graph_folder_path = project_root + "/data/img/graphs"
+    thumbnail_folder_path = project_root + "/data/img/thumbnails"
     reports_folder_path = project_root + "/data/reports"
+    model_cache_path = project_root + "/data/model_cache"
 
@@ -0,0 +1,137 @@
+""" Users of the app in an SQLite database
+The users are found by the unique index on (first name, last name, middle name)
+and the found rows are cached in memory.
+On the first start the users of logins.csv are moved to the database once,
+with the ids equal to their row numbers in the CSV
+"""
+
+import os
+import csv
+import sqlite3
+import threading
+from typing import Union
+import ui_config
+
+# column of the database for every column of logins.csv
+COLUMNS = {"First Name": "first_name",
+           "Second Name": "last_name",
+           "Middle Name": "middle_name",
+           "Password": "password",
+           "Photo Path": "photo_path",
+           "Gender": "gender",
+           "Age": "age",
+           "Shoulder Size": "shoulder_size",
+           "Height": "height",
+           "Weight": "weight"}
+
+
+def parse_csv_value(value: str) -> Union[str, int, float]:
+    """ The values of the CSV as pandas read them: numbers as numbers, empty and nan as "" """
+    if value in ("", "nan", "NaN"):
+        return ""
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+class UserStore:
+    """ Rows are returned as {"id": ..., "First Name": ..., ...} with the headers of logins.csv """
+    def __init__(self, db_path: str, csv_path: Union[str, None] = None):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.cache = dict()  # (first name, last name, middle name): row
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.create_tables()
+        if csv_path is not None and os.path.exists(csv_path) and not self.is_migrated(csv_path):
+            self.migrate_csv(csv_path)
+
+    def create_tables(self) -> None:
+        columns = ", ".join(f"{column} TEXT NOT NULL DEFAULT ''" if column.endswith("name")
+                            else column for column in COLUMNS.values())
+        with self.lock, self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, {columns})")
+            self.connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS users_name "
+                                    "ON users (first_name, last_name, middle_name)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS migrations (path TEXT PRIMARY KEY)")
+
+    def is_migrated(self, csv_path: str) -> bool:
+        with self.lock:
+            row = self.connection.execute("SELECT 1 FROM migrations WHERE path = ?",
+                                          (os.path.abspath(csv_path),)).fetchone()
+        return row is not None
+
+    def migrate_csv(self, csv_path: str) -> int:
+        """ Copy the users of the CSV, the users already in the database are skipped
+        :returns number of users copied
+        """
+        with open(csv_path, newline='') as file:
+            rows = list(csv.DictReader(file))
+        columns = ["id"] + list(COLUMNS.values())
+        query = f"INSERT OR IGNORE INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with self.lock, self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(query, [[user_id] + [parse_csv_value(row.get(header, ""))
+                                                             for header in COLUMNS]
+                                                for user_id, row in enumerate(rows)])
+            copied = self.connection.total_changes - before
+            self.connection.execute("INSERT INTO migrations (path) VALUES (?)", (os.path.abspath(csv_path),))
+        print(f"{copied} users moved from {csv_path} to {self.db_path}")
+        return copied
+
+    @staticmethod
+    def to_dict(row: sqlite3.Row) -> dict:
+        return {"id": row["id"], **{header: row[column] for header, column in COLUMNS.items()}}
+
+    def find(self, first_name: str, last_name: str, middle_name: str) -> Union[dict, None]:
+        key = (first_name, last_name, middle_name)
+        if key in self.cache:
+            return self.cache[key]
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM users "
+                                          "WHERE first_name = ? AND last_name = ? AND middle_name = ?",
+                                          key).fetchone()
+        if row is None:
+            return None
+        self.cache[key] = self.to_dict(row)
+        return self.cache[key]
+
+    def get_all(self) -> dict[int, dict]:
+        """ {id: row} of all users, not cached """
+        with self.lock:
+            rows = self.connection.execute("SELECT * FROM users").fetchall()
+        return {row["id"]: self.to_dict(row) for row in rows}
+
+    def add(self, data: list) -> bool:
+        """ data is ordered as the columns of logins.csv
+        :returns False if a user with the same name already exists
+        """
+        query = f"INSERT INTO users ({', '.join(COLUMNS.values())}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        try:
+            with self.lock, self.connection:
+                self.connection.execute(query, ["" if value is None else value for value in data])
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_photo_path(self, user_id: int, photo_path: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE users SET photo_path = ? WHERE id = ?", (photo_path, user_id))
+        for row in self.cache.values():
+            if row["id"] == user_id:
+                row["Photo Path"] = photo_path
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def main():
+    """ Move the users of logins.csv to the database """
+    UserStore(ui_config.FilePaths.user_db_path.value, csv_path=ui_config.FilePaths.user_login_db_path.value)
+
+
+if __name__ == '__main__':
+    main()